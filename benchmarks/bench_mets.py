@@ -0,0 +1,49 @@
+"""measures remove_unresolved_fptrs and rewrite_img_urls on synthetic METS files of
+growing size; a constant time per page shows the runtime is linear. The former list
+based lookup is timed for comparison up to 5,000 pages.
+
+run from the repository root with: python -m benchmarks.bench_mets
+"""
+import time
+
+import lxml.etree as ET
+
+from tests.synthetic import synthetic_mets
+from transkribus_utils.mets import make_nsmap, remove_unresolved_fptrs, rewrite_img_urls
+
+SIZES = [1000, 2000, 5000, 10000]
+
+
+class Doc:
+    def __init__(self, tree):
+        self.tree = tree
+
+
+def list_lookup(doc, nsmap=make_nsmap()):
+    """the former implementation, testing membership in a list of all file IDs"""
+    fptr_target_ids = doc.tree.xpath("//mets:div/mets:fptr/@FILEID", namespaces=nsmap)
+    existing_file_ids = doc.tree.xpath("//mets:fileGrp/mets:file/@ID", namespaces=nsmap)
+    for fptr_target_id in fptr_target_ids:
+        if fptr_target_id not in existing_file_ids:
+            fptr_element = fptr_target_id.getparent()
+            fptr_element.getparent().remove(fptr_element)
+
+
+def timed(func, mets):
+    doc = Doc(ET.fromstring(mets))
+    start = time.perf_counter()
+    func(doc)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"{'pages':>6} {'set index':>12} {'µs/page':>8} {'list lookup':>12}")
+    for pages in SIZES:
+        mets = synthetic_mets(pages)
+        new = timed(remove_unresolved_fptrs, mets)
+        old = f"{timed(list_lookup, mets):11.3f}s" if pages <= 5000 else f"{'-':>12}"
+        print(f"{pages:>6} {new:11.4f}s {new / pages * 1e6:8.2f} {old}")
+    print(f"\n{'pages':>6} {'rewrite':>12} {'µs/page':>8}")
+    for pages in SIZES:
+        rewrite = timed(lambda doc: rewrite_img_urls(doc.tree), synthetic_mets(pages))
+        print(f"{pages:>6} {rewrite:11.4f}s {rewrite / pages * 1e6:8.2f}")
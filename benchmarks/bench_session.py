@@ -0,0 +1,38 @@
+"""compares requests per second of the pooled client session with one
+connection per call (the former module-level requests.get behaviour)
+
+run from the repository root with: python -m benchmarks.bench_session [n_requests]
+"""
+import sys
+import time
+
+import requests
+
+from tests.stub_server import start_stub_server
+from transkribus_utils import ACDHTranskribusUtils
+
+
+def per_call(url, cookies, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        requests.get(url, cookies=cookies).json()
+    return n / (time.perf_counter() - start)
+
+
+def pooled(client, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        client.list_collections()
+    return n / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    server, base_url = start_stub_server()
+    client = ACDHTranskribusUtils(
+        user="stub", password="stub", transkribus_base_url=base_url, goobi_base_url=""
+    )
+    url = f"{base_url}/collections/list"
+    print(f"per call requests.get: {per_call(url, client.login_cookie, n):.0f} req/s")
+    print(f"pooled session:        {pooled(client, n):.0f} req/s")
+    server.shutdown()
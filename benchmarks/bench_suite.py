@@ -0,0 +1,101 @@
+"""measures throughput and peak memory (tracemalloc) of the bulk helpers against a
+local TrpServer stand-in, so regressions can be spotted without Transkribus access.
+The stub server runs in a separate process and serves a collection of n synthetic
+documents; the METS helpers are measured on n synthetic Goobi METS files.
+
+run from the repository root with: python -m benchmarks.bench_suite [--scales 10 1000 10000] [--latency 0.0]
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from tests.stub_server import make_trp_handler, start_stub_server_process
+from tests.synthetic import synthetic_mets
+from transkribus_utils import ACDHTranskribusUtils
+from transkribus_utils.mets import MetsDocument
+
+PAGES = 2
+LINES = 40
+METS_PAGES = 20
+
+
+def bench_collection_to_mets(client, n, max_workers):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        return len(client.collection_to_mets(1, tmp_dir, max_workers=max_workers))
+
+
+def bench_status_report(client, n, max_workers):
+    return len(client.create_status_report("stub", max_workers=max_workers))
+
+
+def bench_get_transcript(client, n, max_workers):
+    for doc_id in range(1, n + 1):
+        md = {"transcript_url": f"{client.base_url}/files/{doc_id}/1.xml"}
+        client.get_transcript(md)
+    return n
+
+
+def bench_get_transcript_streamed(client, n, max_workers):
+    for doc_id in range(1, n + 1):
+        md = {"transcript_url": f"{client.base_url}/files/{doc_id}/1.xml"}
+        client.get_transcript(md, keep_tree=False)
+    return n
+
+
+def bench_mets_rewrite(client, n, max_workers):
+    mets = synthetic_mets(METS_PAGES, dangling_every=5)
+    for _ in range(n):
+        doc = MetsDocument(mets)
+        doc.replace_img_urls()
+        doc.remove_unresolved_fptrs()
+        doc.to_bytes()
+    return n
+
+
+BENCHMARKS = [
+    ("collection_to_mets", bench_collection_to_mets),
+    ("create_status_report", bench_status_report),
+    ("get_transcript", bench_get_transcript),
+    ("get_transcript streamed", bench_get_transcript_streamed),
+    ("METS rewrite", bench_mets_rewrite),
+]
+
+
+def measure(func, client, n, max_workers):
+    """runs func once for the throughput and once under tracemalloc for the peak
+    memory, since tracing slows down the run
+    :return: items per second and peak memory in MiB
+    """
+    start = time.perf_counter()
+    items = func(client, n, max_workers)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(client, n, max_workers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items / elapsed, peak / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    print(f"{'benchmark':<24} {'docs':>6} {'items/s':>9} {'peak MiB':>9}")
+    for n in args.scales:
+        handler = make_trp_handler(docs=n, pages=PAGES, lines=LINES, latency=args.latency)
+        process, base_url = start_stub_server_process(handler)
+        client = ACDHTranskribusUtils(
+            user="stub",
+            password="stub",
+            transkribus_base_url=base_url,
+            goobi_base_url="",
+            pool_maxsize=args.workers,
+        )
+        for name, func in BENCHMARKS:
+            rate, peak = measure(func, client, n, args.workers)
+            print(f"{name:<24} {n:>6} {rate:9.0f} {peak:9.2f}")
+        client.close()
+        process.terminate()
@@ -0,0 +1,66 @@
+"""measures the per-page cost of parsing TrpServer page responses and PAGE XML
+transcripts and extracting their values with string XPaths (as formerly evaluated on
+every call) and with the precompiled XPaths of transkribus_utils.xpaths
+
+run from the repository root with: python -m benchmarks.bench_xpath
+"""
+import time
+
+import lxml.etree as ET
+
+from tests.synthetic import synthetic_page, synthetic_trp_page
+from transkribus_utils.xpaths import (
+    PAGE_2019_NS,
+    TRP_IMG_URL,
+    TRP_THUMB_URL,
+    TRP_TRANSCRIPT_URL,
+    page_line_text,
+)
+
+PAGES = 2000
+LINES = 40
+
+
+def string_page_md(doc_xml):
+    return (
+        doc_xml.xpath("//tsList/transcripts[1]/url/text()")[0],
+        doc_xml.xpath("./thumbUrl/text()")[0],
+        doc_xml.xpath("./url/text()")[0],
+    )
+
+
+def compiled_page_md(doc_xml):
+    return (
+        TRP_TRANSCRIPT_URL(doc_xml)[0],
+        TRP_THUMB_URL(doc_xml)[0],
+        TRP_IMG_URL(doc_xml)[0],
+    )
+
+
+def string_line_text(page):
+    nsmap = {"page": "http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"}
+    return page.xpath(".//page:TextLine//page:Unicode/text()", namespaces=nsmap)
+
+
+def per_page(func, documents):
+    start = time.perf_counter()
+    for x in documents:
+        func(x)
+    return (time.perf_counter() - start) / len(documents) * 1e6
+
+
+if __name__ == "__main__":
+    rows = [
+        ("page metadata", [synthetic_trp_page(i) for i in range(PAGES)], string_page_md, compiled_page_md),
+        ("transcript PAGE 2013", [synthetic_page(LINES)] * PAGES, string_line_text, page_line_text),
+        ("transcript PAGE 2019", [synthetic_page(LINES, ns=PAGE_2019_NS)] * PAGES, None, page_line_text),
+    ]
+    print(f"{PAGES} pages, {LINES} lines per transcript, µs per page")
+    print(f"{'':<22} {'parse':>7} {'string':>8} {'compiled':>9}")
+    for label, documents, old, new in rows:
+        trees = [ET.fromstring(x) for x in documents]
+        if old is not None:
+            assert old(trees[0]) == new(trees[0])
+        parse = per_page(ET.fromstring, documents)
+        old = f"{per_page(old, trees):8.1f}" if old else f"{'-':>8}"
+        print(f"{label:<22} {parse:7.1f} {old} {per_page(new, trees):9.1f}")
@@ -23,6 +23,7 @@ setup(
     },
     include_package_data=True,
     install_requires=["acdh-xml-pyutils", "click"],
+    extras_require={"async": ["httpx"], "parquet": ["pyarrow"]},
     license="MIT",
     zip_safe=False,
     keywords="acdh-transkribus-utils",
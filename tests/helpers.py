@@ -0,0 +1,48 @@
+"""handlers and expectations shared by the tests of the sync and the async client"""
+from tests.stub_server import make_trp_handler
+
+# # iter_run_htr over documents 1-4 of a FlakyHandler collection
+HTR_DOCS = [(1, doc_id) for doc_id in range(1, 5)]
+HTR_OPTIONS = {"max_in_flight": 2, "min_interval": 0, "max_interval": 0, "max_failed_polls": 3}
+HTR_STATES = {
+    1: ("1001", "FINISHED"),
+    2: ("1002", "FAILED"),
+    3: (None, "FAILED"),
+    4: ("1004", "FINISHED"),
+}
+# # the same title uploaded by four workers at once
+SAME_TITLES = ["same title"] * 4
+SAME_TITLE_STATUSES = ["exists", "exists", "exists", "uploaded"]
+REJECTED_TITLE = "reject 1"
+
+
+class FlakyMixin:
+    """fails to start the HTR job of document 3, to report the job of document 2 and to
+    create documents from METS files with 'reject' in their title
+    """
+
+    def handle_post(self, path):
+        if path.endswith("/trhtr") and "id=3" in self.path:
+            # # drop the connection without an answer
+            self.close_connection = True
+            return
+        if "reject" in self.path:
+            self._send(b"", status=500)
+            return
+        super().handle_post(path)
+
+    def do_GET(self):
+        if self.path.endswith("/jobs/1002"):
+            self._send(b"", status=500)
+        else:
+            super().do_GET()
+
+
+def make_flaky_handler(docs=4, pages=1, lines=1):
+    """returns a TrpStubHandler like make_trp_handler, failing as described in FlakyMixin"""
+    return type("FlakyHandler", (FlakyMixin, make_trp_handler(docs, pages, lines)), {})
+
+
+def htr_states(jobs):
+    """maps the doc_id of each job reported by iter_run_htr to its (job_id, state)"""
+    return {x["doc_id"]: (x["job_id"], x["state"]) for x in jobs}
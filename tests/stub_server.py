@@ -0,0 +1,269 @@
+"""a minimal local stand-in for the TrpServer REST API used by the tests and benchmarks"""
+import hashlib
+import itertools
+import json
+import multiprocessing
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from tests.synthetic import synthetic_mets, synthetic_page, synthetic_trp_page
+
+LOGIN_XML = b"<trpUserLogin><sessionId>stub-session</sessionId></trpUserLogin>"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # buffer headers and body into one write, otherwise keep-alive
+    # connections stall on delayed ACKs
+    wbufsize = -1
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type="application/json", status=200):
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.request_body = self.rfile.read(length)
+        if self.path.endswith("/auth/login"):
+            self._send(LOGIN_XML, content_type="application/xml")
+        else:
+            self.handle_post(self.path.split("?")[0])
+
+    def handle_post(self, path):
+        """answers a POST request other than the login; its body is in request_body"""
+        self._send(b"", status=404)
+
+    def do_GET(self):
+        if "/collections/list" in self.path:
+            body = [{"colId": 1, "colName": "stub-collection"}]
+            self._send(json.dumps(body).encode("utf-8"))
+        else:
+            self._send(b"", status=404)
+
+
+def start_stub_server(handler=StubHandler, host="127.0.0.1", port=0):
+    """starts the stub server in a daemon thread
+    :return: the server and its base url
+    """
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/TrpServer/rest"
+    return server, base_url
+
+
+DOC_URL = re.compile(r"/collections/(\d+)/(\d+)/(fulldoc|metadata|mets|imageNames|\d+)$")
+IMAGE_URL = re.compile(r"/files/(\d+)/(\d+)\.jpg$")
+TRANSCRIPT_URL = re.compile(r"/collections/(\d+)/(\d+)/(\d+)/(text|\d+)$")
+
+
+class TrpStubHandler(StubHandler):
+    """serves a synthetic collection (colId 1) of `docs` documents with `pages` pages
+    each, every page with a PAGE XML transcript of `lines` lines; use make_trp_handler
+    to configure the sizes. A Goobi viewer stand-in serves a METS file for any id at
+    /viewer/sourcefile?id=..., except for ids starting with 'missing', and records the
+    Cookie header of each of its requests in `viewer_cookies`; uploaded METS files are
+    accepted and their requests recorded in `uploads`. HTR jobs finish at once.
+    Transcripts posted to /{page}/text of an existing page become its latest version,
+    status updates of the latest version are accepted; both are recorded in `saved`.
+    Page images are served for GET and HEAD requests; /fulldoc lists the md5Sum of the
+    images of odd pages only, so clients compare the size of the others
+    """
+
+    docs = 10
+    pages = 2
+    lines = 20
+    uploads = []
+    viewer_cookies = []
+    # # (doc_id, page_nr) -> list of (ts_id, params) of the posted versions and status updates
+    saved = {}
+    ts_ids = itertools.count(100001)
+    _page_xml = None
+
+    def _base_url(self):
+        return f"http://{self.headers['Host']}/TrpServer/rest"
+
+    def _latest_ts_id(self, doc_id, page_nr):
+        versions = self.saved.get((doc_id, page_nr))
+        return versions[-1][0] if versions else doc_id * 1000 + page_nr
+
+    def _save_transcript(self, match):
+        """stores a new version of a transcript or the status of the latest version"""
+        doc_id, page_nr, what = int(match.group(2)), int(match.group(3)), match.group(4)
+        params = parse_qs(urlsplit(self.path).query)
+        if doc_id > self.docs or page_nr > self.pages:
+            self._send(b"", status=404)
+        elif what == "text":
+            ts_id = next(self.ts_ids)
+            self.saved.setdefault((doc_id, page_nr), []).append((ts_id, params))
+            self._send(json.dumps({"tsId": ts_id}).encode("utf-8"))
+        elif int(what) == self._latest_ts_id(doc_id, page_nr):
+            self.saved.setdefault((doc_id, page_nr), []).append((int(what), params))
+            self._send(b"", content_type="text/plain")
+        else:
+            self._send(b"", status=404)
+
+    @staticmethod
+    def _image(doc_id, page_nr):
+        """returns the bytes of the image of a page"""
+        return f"image {doc_id} {page_nr}\n".encode("utf-8") * 1000
+
+    def _fulldoc(self, doc_id):
+        base = self._base_url()
+        pages = []
+        for nr in range(1, self.pages + 1):
+            transcript = {
+                "tsId": self._latest_ts_id(doc_id, nr),
+                "url": f"{base}/files/{doc_id}/{nr}.xml",
+                "timestamp": 1700000000000,
+                "md5Sum": f"{doc_id:08x}{nr:08x}",
+            }
+            pages.append(
+                {
+                    "pageId": doc_id * 1000 + nr,
+                    "docId": doc_id,
+                    "pageNr": nr,
+                    "key": f"KEY{doc_id}_{nr}",
+                    "url": f"{base}/files/{doc_id}/{nr}.jpg",
+                    "thumbUrl": f"{base}/files/{doc_id}/{nr}_thumb.jpg",
+                    "imgFileName": f"{nr:04}.jpg",
+                    "tsList": {"transcripts": [transcript]},
+                }
+            )
+            if nr % 2:
+                pages[-1]["md5Sum"] = hashlib.md5(self._image(doc_id, nr)).hexdigest()
+        return {"md": {"docId": doc_id, "title": f"doc {doc_id}"}, "pageList": {"pages": pages}}
+
+    def handle_post(self, path):
+        match = TRANSCRIPT_URL.search(path)
+        if match is not None:
+            self._save_transcript(match)
+        elif path.endswith("/createDocFromMetsUrl") or path.endswith("/createDocFromMets"):
+            self.uploads.append(self.path)
+            self._send(b"", content_type="text/plain")
+        elif path.endswith("/trhtr"):
+            # # the job of a document finishes immediately, its ID is 1000 + the docId
+            doc_id = int(parse_qs(urlsplit(self.path).query)["id"][0])
+            self._send(f"{1000 + doc_id}".encode("utf-8"), content_type="text/plain")
+        else:
+            super().handle_post(path)
+
+    def do_HEAD(self):
+        match = IMAGE_URL.search(urlsplit(self.path).path)
+        size = len(self._image(int(match.group(1)), int(match.group(2)))) if match else 0
+        self.send_response(200 if match else 404)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+
+    def do_GET(self):
+        path, query = urlsplit(self.path)[2:4]
+        match = DOC_URL.search(path)
+        image = IMAGE_URL.search(path)
+        if path.endswith("/viewer/sourcefile"):
+            self.viewer_cookies.append(self.headers.get("Cookie"))
+            title = parse_qs(query)["id"][0]
+            if title.startswith("missing"):
+                self._send(b"<html>not found</html>", content_type="text/html", status=404)
+            else:
+                body = synthetic_mets(self.pages, title, dangling_every=0)
+                self._send(body, content_type="application/xml")
+        elif path.endswith("/collections/list"):
+            super().do_GET()
+        elif "/jobs/" in path:
+            job_id = path.rsplit("/", 1)[1]
+            self._send(json.dumps({"jobId": job_id, "state": "FINISHED"}).encode("utf-8"))
+        elif path.endswith("/collections/1/list"):
+            body = [
+                {"docId": x, "title": f"doc {x}", "nrOfPages": self.pages}
+                for x in range(1, self.docs + 1)
+            ]
+            self._send(json.dumps(body).encode("utf-8"))
+        elif match is not None:
+            doc_id, what = int(match.group(2)), match.group(3)
+            if what == "fulldoc":
+                self._send(json.dumps(self._fulldoc(doc_id)).encode("utf-8"))
+            elif what == "metadata":
+                body = {
+                    "docId": doc_id,
+                    "title": f"doc {doc_id}",
+                    "nrOfPages": self.pages,
+                    "nrOfTranscribedLines": self.pages * self.lines,
+                    "thumbUrl": f"{self._base_url()}/files/{doc_id}/1_thumb.jpg",
+                }
+                self._send(json.dumps(body).encode("utf-8"))
+            elif what == "mets":
+                body = synthetic_mets(self.pages, f"doc_{doc_id}", dangling_every=0)
+                self._send(body, content_type="application/xml")
+            elif what == "imageNames":
+                body = "\n".join(f"{x:04}.jpg" for x in range(1, self.pages + 1))
+                self._send(body.encode("utf-8"), content_type="text/plain")
+            else:
+                page_nr = int(what)
+                body = synthetic_trp_page(
+                    page_nr,
+                    ts_id=self._latest_ts_id(doc_id, page_nr),
+                    files_url=f"{self._base_url()}/files/{doc_id}/{page_nr}.xml?id=",
+                )
+                self._send(body, content_type="application/xml")
+        elif image is not None:
+            self._send(self._image(int(image.group(1)), int(image.group(2))), content_type="image/jpeg")
+        elif path.endswith(".xml") and "/files/" in path:
+            # # all transcripts are served the same PAGE XML
+            if self._page_xml is None:
+                type(self)._page_xml = synthetic_page(self.lines)
+            self._send(self._page_xml, content_type="application/xml")
+        else:
+            self._send(b"", status=404)
+
+
+def make_trp_handler(docs=10, pages=2, lines=20, latency=0.0):
+    """returns a TrpStubHandler serving docs documents of pages pages with lines lines,
+    answering each request after latency seconds
+    """
+    attrs = {
+        "docs": docs,
+        "pages": pages,
+        "lines": lines,
+        "latency": latency,
+        "uploads": [],
+        "viewer_cookies": [],
+        "saved": {},
+        "ts_ids": itertools.count(100001),
+    }
+    return type("ConfiguredTrpStubHandler", (TrpStubHandler,), attrs)
+
+
+def _serve(handler, host, port, queue):
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_stub_server_process(handler=StubHandler, host="127.0.0.1", port=0):
+    """starts the stub server in a forked process, so its allocations and CPU time
+    do not show up in measurements of the client
+    :return: the process and the base url of the server
+    """
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(
+        target=_serve, args=(handler, host, port, queue), daemon=True
+    )
+    process.start()
+    base_url = f"http://{host}:{queue.get(timeout=10)}/TrpServer/rest"
+    return process, base_url
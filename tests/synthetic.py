@@ -0,0 +1,103 @@
+"""generators for synthetic TRANSKRIBUS/Goobi payloads used by the tests and benchmarks"""
+
+METS_HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:mods="http://www.loc.gov/mods/v3" \
+xmlns:xlink="http://www.w3.org/1999/xlink">
+<mets:dmdSec ID="DMDLOG_0000"><mets:mdWrap MDTYPE="MODS"><mets:xmlData><mods:mods>
+<mods:titleInfo><mods:title>{title}</mods:title></mods:titleInfo>
+</mods:mods></mets:xmlData></mets:mdWrap></mets:dmdSec>
+"""
+
+
+def synthetic_mets(pages, title="synthetic", dangling_every=10, missing_default_every=0):
+    """returns a Goobi-like METS file with a PRESENTATION and a DEFAULT fileGrp and a
+    physical structMap with two fptrs per page
+    :param pages: number of pages
+    :param dangling_every: every n-th page gets an extra fptr to a missing file
+    :param missing_default_every: every n-th page has no DEFAULT file (0 for none)
+    :return: the METS as bytes
+    """
+    parts = [METS_HEAD.format(title=title), "<mets:fileSec>"]
+    parts.append('<mets:fileGrp USE="PRESENTATION">')
+    for i in range(1, pages + 1):
+        parts.append(
+            f'<mets:file ID="FILE_{i:05}_PRESENTATION" MIMETYPE="image/tiff">'
+            f'<mets:FLocat LOCTYPE="URL" xlink:href="file:///opt/digiverso/viewer/media/'
+            f'{title}/{title}_{i:05}.tif"/></mets:file>'
+        )
+    parts.append('</mets:fileGrp><mets:fileGrp USE="DEFAULT">')
+    for i in range(1, pages + 1):
+        if missing_default_every and i % missing_default_every == 0:
+            continue
+        parts.append(
+            f'<mets:file ID="FILE_{i:05}_DEFAULT" MIMETYPE="image/jpeg">'
+            f'<mets:FLocat LOCTYPE="URL" xlink:href="https://viewer.acdh.oeaw.ac.at/viewer/'
+            f'content/{title}/800/0/{title}_{i:05}.jpg"/></mets:file>'
+        )
+    parts.append("</mets:fileGrp></mets:fileSec>")
+    parts.append('<mets:structMap TYPE="PHYSICAL"><mets:div ID="PHYS_0000" TYPE="physSequence">')
+    for i in range(1, pages + 1):
+        parts.append(f'<mets:div ID="PHYS_{i:05}" ORDER="{i}" TYPE="page">')
+        parts.append(f'<mets:fptr FILEID="FILE_{i:05}_PRESENTATION"/>')
+        parts.append(f'<mets:fptr FILEID="FILE_{i:05}_DEFAULT"/>')
+        if dangling_every and i % dangling_every == 0:
+            parts.append(f'<mets:fptr FILEID="FILE_{i:05}_FULLTEXT"/>')
+        parts.append("</mets:div>")
+    parts.append("</mets:div></mets:structMap></mets:mets>")
+    return "".join(parts).encode("utf-8")
+
+
+PAGE_HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<PcGts xmlns="{ns}"><Metadata><Creator>synthetic</Creator></Metadata>
+<Page imageFilename="synthetic.jpg" imageWidth="2000" imageHeight="3000">
+"""
+
+
+def synthetic_page(
+    lines,
+    lines_per_region=20,
+    ns="http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15",
+):
+    """returns a PAGE XML document with word level and line level TextEquivs
+    :param lines: number of TextLines
+    :param lines_per_region: number of TextLines per TextRegion
+    :param ns: the PAGE namespace, i.e. the schema version
+    :return: the document as bytes
+    """
+    parts = [PAGE_HEAD.format(ns=ns)]
+    for i in range(lines):
+        if i % lines_per_region == 0:
+            if i:
+                parts.append("</TextRegion>")
+            parts.append(f'<TextRegion id="r{i // lines_per_region}"><Coords points="0,0 1,1"/>')
+        parts.append(
+            f'<TextLine id="l{i}"><Coords points="0,{i} 100,{i}"/>'
+            f'<Word id="w{i}"><TextEquiv><Unicode>line</Unicode></TextEquiv></Word>'
+            f'<TextEquiv conf="0.9"><Unicode>line {i}</Unicode></TextEquiv></TextLine>'
+        )
+    if lines:
+        parts.append("</TextRegion>")
+    parts.append("</Page></PcGts>")
+    return "".join(parts).encode("utf-8")
+
+
+def synthetic_trp_page(
+    page_nr, transcripts=3, ts_id=None, files_url="https://files.transkribus.eu/Get?id="
+):
+    """returns the TrpServer XML of a page with its transcript versions, latest first
+    :param ts_id: ID of the latest transcript, the older ones count down from it
+    :param files_url: prefix of the image and transcript URLs
+    """
+    if ts_id is None:
+        ts_id = page_nr * 10 + transcripts
+    ts = "".join(
+        f"<transcripts><tsId>{ts_id - i}</tsId><url>{files_url}TS{page_nr}_{i}</url>"
+        "<status>IN_PROGRESS</status></transcripts>"
+        for i in range(transcripts)
+    )
+    return (
+        f"<trpPage><pageId>{page_nr}</pageId><pageNr>{page_nr}</pageNr>"
+        f"<url>{files_url}IMG{page_nr}</url>"
+        f"<thumbUrl>{files_url}IMG{page_nr}&amp;fileType=thumb</thumbUrl>"
+        f"<tsList>{ts}</tsList></trpPage>"
+    ).encode("utf-8")
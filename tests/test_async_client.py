@@ -0,0 +1,158 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from transkribus_utils.async_client import AsyncACDHTranskribusUtils  # noqa: E402
+from transkribus_utils.concurrency import bounded_map_async  # noqa: E402
+from transkribus_utils.metrics import MetricsCollector  # noqa: E402
+from transkribus_utils.transkribus_utils import _transcript_lines  # noqa: E402
+from transkribus_utils.transport import TransportPolicy  # noqa: E402
+
+from tests.helpers import (  # noqa: E402
+    HTR_DOCS,
+    HTR_OPTIONS,
+    HTR_STATES,
+    REJECTED_TITLE,
+    SAME_TITLE_STATUSES,
+    SAME_TITLES,
+    htr_states,
+    make_flaky_handler,
+)
+from tests.stub_server import start_stub_server  # noqa: E402
+from tests.synthetic import synthetic_page  # noqa: E402
+
+DOCS = 5
+PAGES = 2
+LINES = 3
+
+
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+    """Tests for `AsyncACDHTranskribusUtils` against a local TrpServer stand-in."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.handler = make_flaky_handler(docs=DOCS, pages=PAGES, lines=LINES)
+        cls.server, cls.base_url = start_stub_server(cls.handler)
+        cls.goobi_base_url = cls.base_url.replace("/TrpServer/rest", "/viewer/sourcefile")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    async def asyncSetUp(self):
+        self.handler.uploads.clear()
+        self.metrics = MetricsCollector()
+        self.client = AsyncACDHTranskribusUtils(
+            user="stub",
+            password="stub",
+            transkribus_base_url=self.base_url,
+            goobi_base_url=self.goobi_base_url,
+            transport=TransportPolicy(max_retries=0),
+            hooks=[self.metrics],
+        )
+        await self.client.__aenter__()
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_001_list_docs(self):
+        docs = await self.client.list_docs(1)
+        self.assertEqual([x["docId"] for x in docs], list(range(1, DOCS + 1)))
+        for page_size in (2, DOCS, 10):
+            doc_ids = [x["docId"] async for x in self.client.iter_docs(1, page_size=page_size)]
+            self.assertEqual(doc_ids, list(range(1, DOCS + 1)))
+
+    async def test_002_transcripts(self):
+        lines = _transcript_lines(synthetic_page(LINES))[1]
+        pages = dict([x async for x in self.client.iter_doc_transcripts(1, 1)])
+        self.assertEqual(pages, {x: lines for x in range(1, PAGES + 1)})
+        md = await self.client.get_fulldoc_md(1, 1)
+        self.assertEqual(md["session_id"], "stub-session")
+        md = await self.client.get_transcript(md)
+        self.assertEqual(md["transcript"], lines)
+
+    async def test_003_save_mets(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = await self.client.save_mets_to_file(1, 1, tmp_dir)
+            self.assertTrue(os.path.isfile(file_name))
+            file_name = await self.client.save_image_names_to_file(1, 1, tmp_dir)
+            self.assertTrue(os.path.isfile(file_name))
+
+    async def test_004_upload_mets_file_from_url(self):
+        url = self.goobi_base_url + "?id={}"
+        self.assertTrue(await self.client.upload_mets_file_from_url(url.format("new 1"), 1))
+        self.assertEqual(len(self.handler.uploads), 1)
+        # # the error page of the viewer is not parsed as METS
+        self.assertFalse(await self.client.upload_mets_file_from_url(url.format("missing 1"), 1))
+        self.assertFalse(await self.client.upload_mets_file_from_url(url.format("doc 1"), 1))
+        self.assertEqual(await self.client._upload_mets_file(url.format("doc 1"), 1), "exists")
+        self.assertEqual(len(self.handler.uploads), 1)
+        host, port = self.server.server_address
+        self.assertEqual(self.metrics.requests[("GET", f"{host}:{port}/viewer/sourcefile", "404")][0], 1)
+        # # the session cookie is only sent to Transkribus
+        self.assertEqual(set(self.handler.viewer_cookies), {None})
+        request = self.client.client.build_request("GET", "https://iiif.onb.ac.at/x")
+        self.assertNotIn("Cookie", request.headers)
+        request = self.client.client.build_request("GET", f"{self.base_url}/collections/list")
+        self.assertEqual(request.headers["Cookie"], "JSESSIONID=stub-session")
+        request = self.client.client.build_request("GET", "https://files.transkribus.eu/Get?id=1")
+        self.assertEqual(request.headers["Cookie"], "JSESSIONID=stub-session")
+
+    async def test_005_iter_upload_mets_files_from_goobi(self):
+        titles = ["doc 2", "new 2", "missing 2", "new 3", "missing 3"]
+        results = [
+            x async for x in self.client.iter_upload_mets_files_from_goobi(titles, col_id=1, max_workers=2)
+        ]
+        self.assertEqual(sorted(results), sorted(
+            [("doc 2", "exists"), ("new 2", "uploaded"), ("missing 2", "failed"),
+             ("new 3", "uploaded"), ("missing 3", "failed")]
+        ))
+        self.assertEqual(len(self.handler.uploads), 2)
+        results = await self.client.upload_mets_files_from_goobi(["new 4"], col_id=1)
+        self.assertEqual(results, {"new 4": "uploaded"})
+        with pytest.raises(AttributeError):
+            await self.client.upload_mets_files_from_goobi(["new 5"])
+
+    async def test_006_bounded_map_async(self):
+        running = []
+        max_running = []
+
+        async def work(x):
+            running.append(x)
+            max_running.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(x)
+            if x == 3:
+                raise ValueError(x)
+            return x * 2
+
+        results = [x async for x in bounded_map_async(work, range(10), max_workers=3)]
+        self.assertEqual(max(max_running), 3)
+        self.assertEqual(sorted(x for x, _, e in results if e is None), [0, 1, 2, 4, 5, 6, 7, 8, 9])
+        self.assertEqual([(x, type(e)) for x, _, e in results if e is not None], [(3, ValueError)])
+
+    async def test_007_iter_run_htr(self):
+        jobs = [x async for x in self.client.iter_run_htr(HTR_DOCS, **HTR_OPTIONS)]
+        self.assertEqual(htr_states(jobs), HTR_STATES)
+
+    async def test_008_concurrent_uploads_of_one_title(self):
+        results = [
+            x
+            async for x in self.client.iter_upload_mets_files_from_goobi(
+                SAME_TITLES, check_name=False, col_id=1, max_workers=len(SAME_TITLES)
+            )
+        ]
+        self.assertEqual(sorted(x for _, x in results), SAME_TITLE_STATUSES)
+        self.assertEqual(len(self.handler.uploads), 1)
+        self.assertTrue(await self.client.document_exists("Same  Title", 1))
+        # # the title of a failed upload is released again
+        url = self.client.goobi_base_url.format(REJECTED_TITLE)
+        self.assertFalse(await self.client.upload_mets_file_from_url(url, 1))
+        self.assertFalse(await self.client.document_exists(REJECTED_TITLE, 1))
+        self.assertEqual(await self.client._upload_mets_file(url, 1), "failed")
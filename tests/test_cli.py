@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from transkribus_utils.cli import import_goobi_mets_to_transkribus, read_journal, read_titles
+
+from tests.stub_server import make_trp_handler, start_stub_server
+
+
+class TestCli(unittest.TestCase):
+    """Tests for the Goobi import CLI against a local TrpServer stand-in."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.handler = make_trp_handler(docs=3, pages=1, lines=1)
+        cls.server, cls.base_url = start_stub_server(cls.handler)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.handler.uploads.clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.titles = os.path.join(self.tmp_dir.name, "titles.txt")
+        self.journal = f"{self.titles}.journal"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_cli(self, *args):
+        result = CliRunner().invoke(
+            import_goobi_mets_to_transkribus,
+            [
+                "-f", self.titles,
+                "-c", "1",
+                "--user", "stub",
+                "--password", "stub",
+                "--transkribus-base-url", self.base_url,
+                "--goobi-base-url", self.base_url.replace("/TrpServer/rest", "/viewer/sourcefile"),
+                *args,
+            ],
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        return result
+
+    def test_001_read_titles(self):
+        with open(self.titles, "w") as f:
+            f.write("a\n\n  b  \nc\n")
+        self.assertEqual(list(read_titles(self.titles)), ["a", "b", "c"])
+        self.assertEqual(list(read_titles(self.titles, skip={"b"})), ["a", "c"])
+
+    def test_002_read_journal(self):
+        self.assertEqual(read_journal(self.journal), set())
+        with open(self.journal, "w") as f:
+            f.write("a\tuploaded\n\nb\texists\n")
+        self.assertEqual(read_journal(self.journal), {"a", "b"})
+
+    def test_003_resume(self):
+        with open(self.titles, "w") as f:
+            f.write("doc 1\nnew 1\nmissing 1\nnew 2\n")
+        self.run_cli("-w", "2")
+        with open(self.journal) as f:
+            journal = f.read().splitlines()
+        self.assertEqual(sorted(journal), ["doc 1\texists", "new 1\tuploaded", "new 2\tuploaded"])
+        self.assertEqual(len(self.handler.uploads), 2)
+        # # only the failed title is tried again
+        result = self.run_cli("--resume")
+        self.assertIn("missing 1: failed", result.output)
+        self.assertNotIn("new 1", result.output)
+        self.assertEqual(len(self.handler.uploads), 2)
+        # # a run without --resume appends to the journal instead of truncating it
+        self.run_cli()
+        with open(self.journal) as f:
+            self.assertEqual(f.read().splitlines()[:3], journal)
+        self.assertEqual(len(self.handler.uploads), 4)
@@ -0,0 +1,245 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from transkribus_utils import ACDHTranskribusUtils
+from transkribus_utils.cache import HTTPCache
+from transkribus_utils.transport import TransportPolicy
+
+from tests.helpers import (
+    HTR_DOCS,
+    HTR_OPTIONS,
+    HTR_STATES,
+    REJECTED_TITLE,
+    SAME_TITLE_STATUSES,
+    SAME_TITLES,
+    htr_states,
+    make_flaky_handler,
+)
+from tests.stub_server import make_trp_handler, start_stub_server
+
+
+class SyncHandler(make_trp_handler(docs=4, pages=2, lines=1)):
+    """serves the transcripts of the documents in `revisions` with a changed md5Sum"""
+
+    revisions = {}
+
+    def _fulldoc(self, doc_id):
+        fulldoc = super()._fulldoc(doc_id)
+        if doc_id in self.revisions:
+            transcript = fulldoc["pageList"]["pages"][0]["tsList"]["transcripts"][0]
+            transcript["md5Sum"] = f"{transcript['md5Sum']}-{self.revisions[doc_id]}"
+        return fulldoc
+
+
+class ImageHandler(make_trp_handler(docs=2, pages=3, lines=1)):
+    """serves a corrupt image for page 1 and a truncated one for page 3 of document 2"""
+
+    def do_GET(self):
+        if self.path.endswith("/files/2/1.jpg"):
+            self._send(b"corrupt", content_type="image/jpeg")
+        elif self.path.endswith("/files/2/3.jpg"):
+            # # announce the whole image but close the connection after a part of it
+            body = self._image(2, 3)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:100])
+            self.close_connection = True
+        else:
+            super().do_GET()
+
+
+class TestClient(unittest.TestCase):
+    """Tests for `ACDHTranskribusUtils` against a local TrpServer stand-in."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.handler = make_flaky_handler()
+        cls.server, cls.base_url = start_stub_server(cls.handler)
+        cls.client = ACDHTranskribusUtils(
+            user="stub",
+            password="stub",
+            transkribus_base_url=cls.base_url,
+            goobi_base_url=cls.base_url.replace("/TrpServer/rest", "/viewer/sourcefile"),
+            transport=TransportPolicy(max_retries=0),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_001_iter_run_htr(self):
+        jobs = self.client.iter_run_htr(HTR_DOCS, **HTR_OPTIONS)
+        self.assertEqual(htr_states(jobs), HTR_STATES)
+
+    def test_002_concurrent_uploads_of_one_title(self):
+        self.handler.uploads.clear()
+        results = self.client.iter_upload_mets_files_from_goobi(
+            SAME_TITLES, check_name=False, col_id=1, max_workers=len(SAME_TITLES)
+        )
+        self.assertEqual(sorted(x for _, x in results), SAME_TITLE_STATUSES)
+        self.assertEqual(len(self.handler.uploads), 1)
+        self.assertTrue(self.client.document_exists("Same  Title", 1))
+        # # the title of a failed upload is released again
+        url = self.client.goobi_base_url.format(REJECTED_TITLE)
+        self.assertFalse(self.client.upload_mets_file_from_url(url, 1))
+        self.assertFalse(self.client.document_exists(REJECTED_TITLE, 1))
+        self.assertEqual(self.client._upload_mets_file(url, 1), "failed")
+        # # the session cookie is not sent to the Goobi viewer
+        self.assertTrue(self.handler.viewer_cookies)
+        self.assertEqual(set(self.handler.viewer_cookies), {None})
+
+    def test_003_sync_collection_to_mets(self):
+        server, base_url = start_stub_server(SyncHandler)
+        client = ACDHTranskribusUtils(
+            user="stub", password="stub", transkribus_base_url=base_url, goobi_base_url=""
+        )
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            col_dir = os.path.join(tmp_dir, "1")
+            manifest_file = os.path.join(col_dir, "sync_manifest.json")
+            report = client.sync_collection_to_mets(1, tmp_dir, max_workers=2)
+            self.assertEqual(sorted(report["added"]), [1, 2, 3, 4])
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+            self.assertEqual(sorted(manifest), ["1", "2", "3", "4"])
+            for doc_id in range(1, 5):
+                self.assertTrue(os.path.isfile(os.path.join(col_dir, f"{doc_id}_mets.xml")))
+                self.assertTrue(os.path.isfile(os.path.join(col_dir, f"{doc_id}_image_name.xml")))
+            report = client.sync_collection_to_mets(1, tmp_dir)
+            self.assertEqual(sorted(report["unchanged"]), [1, 2, 3, 4])
+            self.assertEqual(report["added"] + report["changed"] + report["deleted"], [])
+            # # a new transcript of document 2, document 4 is deleted, a file of 3 is missing
+            SyncHandler.revisions[2] = 1
+            SyncHandler.docs = 3
+            self.addCleanup(setattr, SyncHandler, "docs", 4)
+            self.addCleanup(SyncHandler.revisions.clear)
+            os.remove(os.path.join(col_dir, "3_image_name.xml"))
+            report = client.sync_collection_to_mets(1, tmp_dir, max_workers=2)
+            self.assertEqual(
+                {key: sorted(value) for key, value in report.items()},
+                {"added": [], "changed": [2, 3], "unchanged": [1], "deleted": [4], "failed": []},
+            )
+            with open(manifest_file) as f:
+                new_manifest = json.load(f)
+            self.assertEqual(sorted(new_manifest), ["1", "2", "3"])
+            self.assertNotEqual(new_manifest["2"], manifest["2"])
+            self.assertEqual(new_manifest["1"], manifest["1"])
+            self.assertTrue(os.path.isfile(os.path.join(col_dir, "3_image_name.xml")))
+            self.assertFalse(os.path.exists(os.path.join(col_dir, "4_mets.xml")))
+            self.assertFalse(os.path.exists(os.path.join(col_dir, "4_image_name.xml")))
+            self.assertFalse(os.path.exists(f"{manifest_file}.tmp"))
+        client.close()
+
+    def test_004_close(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache.sqlite")
+            with ACDHTranskribusUtils(
+                user="stub",
+                password="stub",
+                transkribus_base_url=self.base_url,
+                goobi_base_url="",
+                cache_path=path,
+                cache_ttls={r"/metadata$": 3600},
+            ) as client:
+                for _ in range(2):
+                    self.assertEqual(client.get_doc_md(1, 1)["docId"], 1)
+                # # the access time of the hit is buffered until the client is closed
+                accessed = dict(client.cache._accessed)
+                self.assertEqual(len(accessed), 1)
+            cache = HTTPCache(path)
+            for key, accessed_at in accessed.items():
+                self.assertEqual(cache.get(key)["accessed_at"], accessed_at)
+            cache.close()
+
+    def test_005_iter_upload_transcripts(self):
+        self.addCleanup(self.handler.saved.clear)
+        pages = [self.client.get_transcript(self.client.get_fulldoc_md(x, 1)) for x in (1, 2, 3)]
+        self.assertEqual([x["ts_id"] for x in pages], [1001, 2001, 3001])
+        # # document 2 got a new version after it was read, document 1 has no page 2
+        new_ts_id = self.client.upload_transcript(1, 2, 1, pages[1]["page_xml"], parent_ts_id=2001)
+        self.assertTrue(new_ts_id)
+        pages.append({**pages[0], "page_id": "2", "ts_id": None})
+        results = self.client.iter_upload_transcripts(pages, status="IN_PROGRESS", max_workers=2)
+        self.assertEqual(
+            {(page["doc_id"], page["page_id"]): status for page, status in results},
+            {(1, "1"): "uploaded", (2, "1"): "conflict", (3, "1"): "uploaded", (1, "2"): "failed"},
+        )
+        # # uploaded pages hold the ID of their new version
+        ts_id, params = self.handler.saved[(1, 1)][-1]
+        self.assertEqual(pages[0]["ts_id"], ts_id)
+        self.assertEqual(params, {"parent": ["1001"], "status": ["IN_PROGRESS"]})
+        self.assertEqual(self.client.get_fulldoc_md(3, 1)["ts_id"], pages[2]["ts_id"])
+        self.assertEqual(pages[1]["ts_id"], 2001)
+        # # so they can be uploaded again without conflict and their status updated
+        results = self.client.iter_upload_transcripts(pages[:1], note="second pass")
+        self.assertEqual([x for _, x in results], ["uploaded"])
+        results = self.client.iter_update_page_status(pages[:3], "DONE")
+        self.assertEqual(
+            {page["doc_id"]: updated for page, updated in results}, {1: True, 2: False, 3: True}
+        )
+        self.assertEqual(self.handler.saved[(3, 1)][-1], (pages[2]["ts_id"], {"status": ["DONE"]}))
+
+    def test_006_status_report(self):
+        report = self.client.create_status_report("stub", transcription_threshold=0, max_workers=3)
+        self.assertEqual(sorted(x["doc_id"] for x in report), [1, 2, 3, 4])
+        doc = next(x for x in report if x["doc_id"] == 2)
+        self.assertEqual(
+            {key: doc[key] for key in ("col_id", "doc_title", "doc_transcribed", "pages")},
+            {"col_id": 1, "doc_title": "doc 2", "doc_transcribed": True, "pages": 1},
+        )
+        self.assertTrue(doc["doc_thumb"].endswith("/files/2/1_thumb.jpg"))
+        self.assertEqual(doc["doc_md"]["nrOfTranscribedLines"], 1)
+        report = self.client.create_status_report("stub", transcription_threshold=1, max_workers=3)
+        self.assertEqual([x["doc_transcribed"] for x in report], [False] * 4)
+        self.assertEqual(self.client.create_status_report("no such collection", max_workers=3), [])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "report.jsonl")
+            count = self.client.status_report_to_jsonl(
+                file_name, "stub", transcription_threshold=0, max_workers=3
+            )
+            self.assertEqual(count, 4)
+            with open(file_name, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(
+            sorted((json.loads(x) for x in lines), key=lambda x: x["doc_id"]),
+            sorted(self.client.create_status_report("stub", 0), key=lambda x: x["doc_id"]),
+        )
+
+    def test_007_iter_download_doc_images(self):
+        server, base_url = start_stub_server(ImageHandler)
+        client = ACDHTranskribusUtils(
+            user="stub", password="stub", transkribus_base_url=base_url, goobi_base_url=""
+        )
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(client.close)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            def download(doc_id):
+                results = client.iter_download_doc_images(doc_id, 1, tmp_dir, max_workers=2)
+                return {page_nr: status for page_nr, _, status in results}
+
+            self.assertEqual(download(1), {1: "downloaded", 2: "downloaded", 3: "downloaded"})
+            for page_nr in (1, 2, 3):
+                with open(os.path.join(tmp_dir, f"{page_nr:04}.jpg"), "rb") as f:
+                    self.assertEqual(f.read(), ImageHandler._image(1, page_nr))
+            # # a rerun skips the images by md5 hash (pages 1 and 3) or size (page 2)
+            self.assertEqual(download(1), {1: "skipped", 2: "skipped", 3: "skipped"})
+            for page_nr in (1, 2):
+                with open(os.path.join(tmp_dir, f"{page_nr:04}.jpg"), "ab") as f:
+                    f.write(b"changed")
+            self.assertEqual(download(1), {1: "downloaded", 2: "downloaded", 3: "skipped"})
+            with open(os.path.join(tmp_dir, "0001.jpg"), "rb") as f:
+                self.assertEqual(f.read(), ImageHandler._image(1, 1))
+            # # a corrupt or interrupted download leaves neither the image nor a '.part' file
+            shutil.rmtree(tmp_dir)
+            self.assertEqual(download(2), {1: "failed", 2: "downloaded", 3: "failed"})
+            self.assertEqual(sorted(os.listdir(tmp_dir)), ["0002.jpg"])
@@ -0,0 +1,349 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import lxml.etree as ET
+import pytest
+import requests
+
+from transkribus_utils.cache import HTTPCache
+from transkribus_utils.concurrency import iter_paged
+from transkribus_utils.jobs import JobPoller
+from transkribus_utils.mets import MetsDocument, replace_img_urls_in_mets
+from transkribus_utils.metrics import MetricsCollector, endpoint_name
+from transkribus_utils.models import Document, Page, Transcript
+from transkribus_utils.page import iter_text_lines
+from transkribus_utils.search import SearchIndex
+from transkribus_utils.transkribus_utils import _latest_ts_ids, _page_images, _page_md
+from transkribus_utils.transport import CircuitBreaker, TransportPolicy
+from transkribus_utils.xpaths import PAGE_2013_NS, PAGE_2019_NS, page_line_text
+
+file_path = Path(__file__).absolute().parent
+COL_ID = 1
+SAMPLE_METS = os.path.join(file_path, "sample_mets2.xml")
+SAMPLE_PAGE = os.path.join(file_path, "sample_page.xml")
+
+
+class TestOffline(unittest.TestCase):
+    """Tests of the helpers which need no Transkribus access."""
+
+    def test_018_iter_text_lines(self):
+        with open(SAMPLE_PAGE, "rb") as f:
+            lines = list(iter_text_lines(f))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0]["text"], "Erster Abschnitt.")
+        self.assertEqual(lines[0]["region_id"], "r1")
+        self.assertEqual(lines[0]["conf"], 0.93)
+        self.assertEqual(lines[2]["line_id"], "r2l1")
+
+    def test_019_http_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = HTTPCache(os.path.join(tmp_dir, "cache.sqlite"), max_size=10)
+            for x in ["a", "b"]:
+                response = requests.Response()
+                response.status_code = 200
+                response.headers["ETag"] = f'"{x}"'
+                response._content = b"123456"
+                cache.store(cache.key(f"https://example.com/{x}/mets"), response)
+            self.assertIsNone(cache.get("https://example.com/a/mets"))
+            entry = cache.get("https://example.com/b/mets")
+            self.assertEqual(cache.conditional_headers(entry), {"If-None-Match": '"b"'})
+            self.assertFalse(cache.is_fresh(entry, "https://example.com/b/mets"))
+            cached = cache.to_response(entry, "https://example.com/b/mets")
+            self.assertEqual(cached.content, b"123456")
+            self.assertEqual(cache._size, 6)
+            cache.close()
+            # # hits are buffered but still count for the eviction order
+            path = os.path.join(tmp_dir, "lru.sqlite")
+            cache = HTTPCache(path, max_size=20, access_batch_size=10)
+            for x in ["a", "b", "c", "c", "d"]:
+                if x == "d":
+                    self.assertEqual(cache._size, 18)
+                    self.assertIsNotNone(cache.get("a"))
+                    self.assertEqual(len(cache._accessed), 1)
+                response = requests.Response()
+                response._content = b"123456"
+                cache.store(x, response)
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual([x for x in "acd" if cache.get(x) is not None], ["a", "c", "d"])
+            self.assertEqual(cache._size, 18)
+            cache.close()
+            cache = HTTPCache(path, max_size=20)
+            self.assertEqual(cache._size, 18)
+            cache.clear()
+            self.assertEqual(cache._size, 0)
+            cache.close()
+
+    def test_020_transport_policy(self):
+        policy = TransportPolicy(max_retries=2, backoff_factor=1)
+        self.assertTrue(policy.should_retry("GET", 0, 502))
+        self.assertFalse(policy.should_retry("POST", 0, 502))
+        self.assertTrue(policy.should_retry("POST", 0, 429))
+        self.assertFalse(policy.should_retry("GET", 2, 503))
+        self.assertFalse(policy.should_retry("GET", 0, 404))
+        self.assertEqual(policy.delay(0, retry_after="3"), 3)
+        self.assertTrue(0 <= policy.delay(3) <= 8)
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+        breaker.record_failure()
+        self.assertEqual(breaker.reserve(), 0)
+        breaker.record_failure()
+        self.assertTrue(0 < breaker.reserve() <= 0.2)
+        start = time.monotonic()
+        breaker.before_request()
+        self.assertTrue(time.monotonic() - start >= 0.15)
+        # # half-open: only one probe is let through, its failure opens the circuit again
+        self.assertTrue(breaker.reserve() > 0)
+        breaker.record_failure()
+        self.assertTrue(0.15 < breaker.reserve() <= 0.2)
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.reserve(), 0)
+        self.assertEqual(breaker._failures, 0)
+
+    def test_021_mets_document(self):
+        with open(SAMPLE_METS, "rb") as f:
+            doc = MetsDocument(f.read())
+        self.assertEqual(doc.get_title(), "Kelsen Entwurf II")
+        doc.replace_img_urls()
+        doc.remove_unresolved_fptrs()
+        self.assertEqual(doc.to_string(), replace_img_urls_in_mets(SAMPLE_METS))
+        self.assertTrue(isinstance(doc.to_bytes(), bytes))
+
+    def test_022_remove_unresolved_fptrs(self):
+        with open(SAMPLE_METS, "rb") as f:
+            doc = MetsDocument(f.read())
+        div = doc.tree.xpath(".//mets:div[@ORDER='1']", namespaces=doc.nsmap)[0]
+        for file_id in ["FILE_0001_FULLTEXT", "FILE_9999_DEFAULT"]:
+            fptr = ET.SubElement(div, "{http://www.loc.gov/METS/}fptr")
+            fptr.attrib["FILEID"] = file_id
+        self.assertEqual(doc.remove_unresolved_fptrs(), 3)
+        self.assertEqual(len(div), 2)
+
+    def test_023_rewrite_img_urls_unaligned(self):
+        with open(SAMPLE_METS, "rb") as f:
+            doc = MetsDocument(f.read())
+        first_default = doc.tree.xpath(
+            ".//mets:file[@ID='FILE_0001_DEFAULT']", namespaces=doc.nsmap
+        )[0]
+        first_default.getparent().remove(first_default)
+        self.assertEqual(doc.replace_img_urls(), 9)
+        href = doc.tree.xpath(
+            ".//mets:file[@ID='FILE_0002_DEFAULT']/mets:FLocat/@xlink:href",
+            namespaces=doc.nsmap,
+        )[0]
+        self.assertTrue(href.endswith("/kelsen_2__002.tif/full/full/0/default.jpg"))
+        doc.replace_img_urls(lambda href: href.replace("file://", "https://example.com"))
+        href = doc.tree.xpath(
+            ".//mets:file[@ID='FILE_0002_DEFAULT']/mets:FLocat/@xlink:href",
+            namespaces=doc.nsmap,
+        )[0]
+        self.assertEqual(
+            href, "https://example.com/opt/digiverso/viewer/media/kelsen-entwurf-2/kelsen_2__002.tif"
+        )
+
+    def test_024_page_line_text(self):
+        with open(SAMPLE_PAGE, "rb") as f:
+            content = f.read()
+        lines = page_line_text(ET.fromstring(content))
+        self.assertTrue(lines)
+        page_2019 = ET.fromstring(
+            content.replace(PAGE_2013_NS.encode(), PAGE_2019_NS.encode())
+        )
+        self.assertEqual(page_line_text(page_2019), lines)
+
+    def test_025_page_images(self):
+        trp_return = {
+            "pageList": {
+                "pages": [
+                    {"pageNr": 1, "key": "KEY1", "url": "https://files.transkribus.eu/Get?id=KEY1",
+                     "imgFileName": "a.tif", "md5Sum": "abc"},
+                    {"pageNr": 2, "key": "KEY2", "url": "https://files.transkribus.eu/Get?id=KEY2"},
+                ]
+            }
+        }
+        images = _page_images(trp_return)
+        self.assertEqual(images[0]["file_name"], "a.tif")
+        self.assertEqual(images[0]["md5"], "abc")
+        self.assertEqual(images[1]["file_name"], "0002.jpg")
+        images = _page_images(trp_return, iiif_size="1200,")
+        self.assertEqual(images[0]["file_name"], "a.jpg")
+        self.assertIsNone(images[0]["md5"])
+        self.assertIn("/KEY1/full/1200,/0/default.jpg", images[0]["url"])
+
+    def test_026_job_poller(self):
+        poller = JobPoller(min_interval=1, max_interval=3, factor=2)
+        poller.add("1", {"doc_id": 1})
+        poller.add("2", {"doc_id": 2})
+        self.assertEqual(len(poller), 2)
+        self.assertIsNone(poller.update("1", "RUNNING"))
+        self.assertIsNone(poller.update("1", "RUNNING"))
+        self.assertIsNone(poller.update("1", "RUNNING"))
+        self.assertEqual(poller._jobs["1"][1], 3)
+        self.assertEqual(poller.next_due()[0], "2")
+        self.assertIsNone(poller.update("1", None))
+        self.assertIsNone(poller.update("1", "WAITING"))
+        self.assertEqual(poller._jobs["1"][1], 1)
+        self.assertEqual(poller.update("2", "FINISHED"), {"doc_id": 2})
+        self.assertEqual(len(poller), 1)
+        # # a job is given up after max_failed_polls failed polls in a row
+        poller = JobPoller(min_interval=1, max_interval=3, max_failed_polls=2)
+        poller.add("3", {"doc_id": 3})
+        self.assertIsNone(poller.update("3", None))
+        self.assertIsNone(poller.update("3", "RUNNING"))
+        self.assertIsNone(poller.update("3", None))
+        self.assertEqual(poller.update("3", None), {"doc_id": 3})
+        self.assertEqual(len(poller), 0)
+
+    def test_027_write_lines_to_parquet(self):
+        pq = pytest.importorskip("pyarrow.parquet")
+        from transkribus_utils.parquet import write_lines_to_parquet
+
+        with open(SAMPLE_PAGE, "rb") as f:
+            page_lines = list(iter_text_lines(f.read()))
+        lines = [
+            {"col_id": COL_ID, "doc_id": 1, "page_nr": page_nr, **line}
+            for page_nr in range(1, 4)
+            for line in page_lines
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "lines.parquet")
+            self.assertEqual(write_lines_to_parquet(lines, file_name, batch_size=2), len(lines))
+            self.assertEqual(pq.ParquetFile(file_name).metadata.num_rows, len(lines))
+            table = pq.read_table(file_name)
+            # # IDs given as strings are converted, an invalid one leaves no partial file
+            lines = [{**x, "col_id": f"{COL_ID}", "doc_id": "1"} for x in lines]
+            self.assertEqual(write_lines_to_parquet(lines, file_name, batch_size=2), len(lines))
+            self.assertEqual(pq.read_table(file_name).column("col_id")[0].as_py(), COL_ID)
+            with pytest.raises(ValueError):
+                write_lines_to_parquet(lines + [{**lines[0], "doc_id": "x"}], file_name, batch_size=2)
+            self.assertFalse(os.path.exists(file_name))
+        self.assertEqual(table.column("text").to_pylist(), [x["text"] for x in lines])
+
+    def test_028_search_index(self):
+        index = SearchIndex(":memory:")
+        with open(SAMPLE_PAGE, "rb") as f:
+            content = f.read()
+        index.add_page_xml(COL_ID, 1, 1, content, version="v1")
+        index.add_page_xml(COL_ID, 1, 2, content, version="v1")
+        index.add_page_xml(COL_ID, 1, 2, content, version="v2")
+        self.assertEqual(index.page_version(COL_ID, 1, 2), "v2")
+        result = index.ft_search(query="allgemeine", rows=1)
+        self.assertEqual(result["numResults"], 2)
+        self.assertEqual(len(result["pageHits"]), 1)
+        self.assertEqual(result["pageHits"][0]["highlights"], ["<em>Allgemeine</em> Bestimmungen."])
+        self.assertEqual(len(index.search("bestimm*", doc_id=1)), 2)
+        self.assertEqual(index.search('art" OR 1'), [])
+        # # pages are found by the rowid range of their lines, also around empty pages
+        index.add_page(COL_ID, 1, 3, [], version="v1")
+        index.add_page_xml(COL_ID, 2, 1, content, version="v1")
+        index.add_page(COL_ID, 1, 1, [{"text": "neu", "region_id": "r", "line_id": "l"}])
+        result = index.ft_search(query="allgemeine", start=1)
+        self.assertEqual(result["numResults"], 2)
+        self.assertEqual([(x["docId"], x["pageNr"]) for x in result["pageHits"]], [(2, 1)])
+        self.assertEqual(index.ft_search(query="allgemeine", start=5), {"numResults": 2, "pageHits": []})
+        self.assertEqual(index.ft_search(query="allgemeine", doc_id=1)["numResults"], 1)
+        self.assertEqual(index.ft_search(query="neu")["pageHits"][0]["lineIds"], ["l"])
+        index.remove_doc(COL_ID, 1)
+        self.assertEqual(index.ft_search(query="allgemeine")["numResults"], 1)
+        self.assertEqual(index.ft_search(query="neu")["numResults"], 0)
+        self.assertEqual(index.doc_ids(COL_ID), {2})
+        self.assertEqual(index._db.execute("SELECT COUNT(*) FROM lines").fetchone()[0], 3)
+
+    def test_029_metrics(self):
+        base = "https://transkribus.eu/TrpServer/rest"
+        self.assertEqual(
+            endpoint_name(f"{base}/collections/1/23/fulldoc", base), "/collections/{id}/{id}/fulldoc"
+        )
+        self.assertEqual(
+            endpoint_name("https://files.transkribus.eu/Get?id=ABC", base), "files.transkribus.eu/Get"
+        )
+        metrics = MetricsCollector()
+        request = {"event": "request", "method": "GET", "endpoint": "/jobs/{id}", "status": 200}
+        metrics({**request, "elapsed": 0.5, "bytes": 10, "retries": 1})
+        metrics({**request, "elapsed": 1.5, "bytes": None, "retries": 0})
+        metrics({"event": "parse", "kind": "mets", "elapsed": 0.1, "bytes": 5})
+        metrics({"event": "list_docs", "col_id": 1})
+        error = {**request, "status": None, "elapsed": 0.0, "bytes": None, "error": "ConnectionError()"}
+        metrics({**error, "retries": None})
+        metrics({**error, "retries": 2})
+        self.assertEqual(metrics.requests[("GET", "/jobs/{id}", "None")], [2, 0.0, 0, 2])
+        self.assertEqual(
+            metrics.summary(),
+            {"GET /jobs/{id}": {"requests": 4, "seconds": 2.0, "bytes": 10, "retries": 3}},
+        )
+        text = metrics.to_openmetrics()
+        self.assertIn('transkribus_requests_total{method="GET",endpoint="/jobs/{id}",status="200"} 2', text)
+        self.assertIn('transkribus_parsed_bytes_total{kind="mets"} 5', text)
+        self.assertTrue(text.endswith("# EOF\n"))
+
+        def send():
+            raise requests.ConnectionError()
+
+        with pytest.raises(requests.ConnectionError) as e:
+            TransportPolicy(max_retries=2, backoff_factor=0).send("GET", send)
+        self.assertEqual(e.value.retries, 2)
+
+    def test_030_iter_paged(self):
+        items = list(range(25))
+        requested = []
+
+        def fetch_page(index):
+            requested.append(index)
+            return items[index:index + 10]
+
+        self.assertEqual(list(iter_paged(fetch_page, 10)), items)
+        self.assertEqual(requested, [0, 10, 20])
+        # # a server returning more items than requested
+        requested.clear()
+        self.assertEqual(list(iter_paged(fetch_page, 5)), items)
+        self.assertEqual(requested, [0, 10, 20, 25])
+        # # a server ignoring the paging params
+        self.assertEqual(list(iter_paged(lambda index: items, 10)), items)
+        self.assertEqual(list(iter_paged(lambda index: items[:10], 10)), items[:10])
+        self.assertEqual(list(iter_paged(lambda index: [], 10)), [])
+
+    def test_031_transcript_ids(self):
+        trp_return = {
+            "pageList": {
+                "pages": [
+                    {"pageNr": 1, "tsList": {"transcripts": [{"tsId": 12}, {"tsId": 11}]}},
+                    {"pageNr": 2, "tsList": {"transcripts": []}},
+                ]
+            }
+        }
+        self.assertEqual(_latest_ts_ids(trp_return), {1: 12, 2: None})
+        content = (
+            b"<trpPage><url>img</url><thumbUrl>thumb</thumbUrl><tsList>"
+            b"<transcripts><tsId>12</tsId><url>ts12</url></transcripts>"
+            b"<transcripts><tsId>11</tsId><url>ts11</url></transcripts></tsList></trpPage>"
+        )
+        md = _page_md(content)
+        self.assertEqual(md["ts_id"], 12)
+        self.assertEqual(md["transcript_url"], "ts12")
+
+    def test_032_models(self):
+        loaded = []
+
+        def load_raw():
+            loaded.append(1)
+            return {"docId": 1, "title": "a title"}
+
+        doc = Document.from_trp({"docId": 1, "title": "a title", "nrOfPages": 3}, COL_ID, load_raw)
+        self.assertEqual(doc.nr_of_pages, 3)
+        self.assertEqual(loaded, [])
+        self.assertEqual(doc.raw["title"], "a title")
+        self.assertEqual(doc.raw["title"], "a title")
+        self.assertEqual(loaded, [1])
+        with pytest.raises(AttributeError):
+            doc.extra_info = {}
+        page = Page.from_trp(
+            {"docId": 1, "pageNr": 2, "tsList": {"transcripts": [{"tsId": 5, "url": "ts5"}]}}, COL_ID
+        )
+        self.assertEqual((page.ts_id, page.transcript_url), (5, "ts5"))
+        with open(SAMPLE_PAGE, "rb") as f:
+            content = f.read()
+        transcript = Transcript(1, COL_ID, 2, 5, "ts5", ("a", "b"), lambda: ET.fromstring(content))
+        self.assertEqual(transcript.text, "a\nb")
+        self.assertEqual(ET.QName(transcript.tree).localname, "PcGts")
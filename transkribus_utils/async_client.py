@@ -0,0 +1,786 @@
+import asyncio
+import os
+import re
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import lxml.etree as ET
+
+from .concurrency import bounded_map_async
+from .jobs import JobPoller, job_state
+from .metrics import emit, endpoint_name, logger, response_size
+from .mets import MetsDocument
+from .transport import TransportPolicy
+from .transkribus_utils import (
+    _image_names_to_xml,
+    _latest_transcript_urls,
+    _login_cookies,
+    _normalize_title,
+    _page_md,
+    _page_summaries,
+    _transcript_lines,
+    base_url,
+    files_host,
+)
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+class AsyncACDHTranskribusUtils:
+    """asyncio variant of ACDHTranskribusUtils built on httpx
+
+    usage:
+        async with AsyncACDHTranskribusUtils() as client:
+            docs = await client.list_docs(col_id)
+    """
+
+    async def _request(self, method, url, **kwargs):
+        """sends a request through the shared httpx.AsyncClient with the retry, rate
+        limit and circuit breaker settings of self.transport; the number of requests
+        in flight is capped by the client's semaphore
+        :param method: the HTTP method, e.g. 'GET'
+        :param url: the URL to request
+        :param kwargs: kwargs will be forwarded to httpx.AsyncClient.request
+        :return: a httpx.Response
+        """
+
+        async def send():
+            async with self.semaphore:
+                return await self.client.request(method, url, **kwargs)
+
+        start = time.perf_counter()
+        event = {"event": "request", "method": method, "url": url}
+        event["endpoint"] = endpoint_name(url, self.base_url)
+        try:
+            response, retries = await self.transport.send_async(
+                method, send, (httpx.TransportError,)
+            )
+        except Exception as e:
+            event.update(status=None, elapsed=time.perf_counter() - start)
+            self._emit({**event, "bytes": None, "retries": getattr(e, "retries", None), "error": repr(e)})
+            raise
+        event.update(status=response.status_code, elapsed=time.perf_counter() - start)
+        event["bytes"] = response_size(response)
+        event["retries"] = retries
+        self._emit(event)
+        return response
+
+    def _emit(self, event):
+        """passes an event to the logger of this package and to the hooks of the client"""
+        emit(self.hooks, event)
+
+    @contextmanager
+    def _parse_timer(self, kind, content=None):
+        """emits a 'parse' event with the time spent in the with-block"""
+        start = time.perf_counter()
+        yield
+        self._emit(
+            {
+                "event": "parse",
+                "kind": kind,
+                "elapsed": time.perf_counter() - start,
+                "bytes": len(content) if content is not None else None,
+            }
+        )
+
+    async def login(self, user, pw):
+        """log in function
+        :param user: Your TRANSKRIBUS user name, e.g. my.mail@whatever.com
+        :param pw: Your TRANSKRIBUS password
+        :return: The Session ID in case of a successful log in attempt
+        """
+        request_url = f"{self.base_url}/auth/login"
+        res = await self._request("POST", request_url, data={"user": user, "pw": pw})
+        with self._parse_timer("login", res.content):
+            cookies = _login_cookies(res.status_code, res.content, request_url)
+        # # scope the session cookie to the TrpServer and the Transkribus file server,
+        # # so it is not sent to Goobi or IIIF servers
+        trp_url = urlsplit(self.base_url)
+        for name, value in cookies.items():
+            self.client.cookies.set(name, value, domain=trp_url.hostname, path=trp_url.path or "/")
+            self.client.cookies.set(name, value, domain=files_host)
+        self.login_cookie = cookies
+        return cookies
+
+    async def list_collections(self):
+        """Helper function to list all collections
+        :return: A dict with listing the collections
+        """
+        response = await self._request("GET", f"{self.base_url}/collections/list")
+        return response.json()
+
+    async def filter_collections_by_name(self, filter_string):
+        """lists all collections which names contains 'filter_string' collections
+        :param filter_string: a string the collection name should contain
+        :return: A list with all filtered the collections
+        """
+        cols = await self.list_collections()
+        return [x for x in cols if filter_string in x["colName"]]
+
+    async def _iter_listing(self, url, page_size, sort_column, sort_direction, params):
+        """yields the items of a listing endpoint page by page; the next page is
+        requested while the current one is consumed, see concurrency.iter_paged
+        """
+        params = dict(params)
+        if sort_column is not None:
+            params["sortColumn"] = sort_column
+        if sort_direction is not None:
+            params["sortDirection"] = sort_direction
+
+        async def fetch_page(index):
+            response = await self._request(
+                "GET", url, params={**params, "index": index, "nValues": page_size}
+            )
+            response.raise_for_status()
+            return response.json()
+
+        index = 0
+        previous = None
+        task = asyncio.create_task(fetch_page(index))
+        try:
+            while True:
+                items = await task
+                if items == previous:
+                    return
+                if len(items) < page_size:
+                    for x in items:
+                        yield x
+                    return
+                index += len(items)
+                task = asyncio.create_task(fetch_page(index))
+                for x in items:
+                    yield x
+                previous = items
+        finally:
+            task.cancel()
+
+    def iter_collections(self, page_size=100, sort_column=None, sort_direction=None, **params):
+        """Lazily lists all collections in pages of page_size, see
+        ACDHTranskribusUtils.iter_collections
+        :return: An async generator of dicts as returned by list_collections
+        """
+        url = f"{self.base_url}/collections/list"
+        return self._iter_listing(url, page_size, sort_column, sort_direction, params)
+
+    async def iter_filter_collections_by_name(self, filter_string, page_size=100):
+        """lazily lists all collections which names contains 'filter_string'
+        :return: An async generator of the filtered collections
+        """
+        async for x in self.iter_collections(page_size=page_size):
+            if filter_string in x["colName"]:
+                yield x
+
+    def iter_docs(self, col_id, page_size=100, sort_column=None, sort_direction=None, **params):
+        """Lazily lists all documents in a given collection in pages of page_size, see
+        ACDHTranskribusUtils.iter_docs
+        :return: An async generator of dicts as returned by list_docs
+        """
+        url = f"{self.base_url}/collections/{col_id}/list"
+        return self._iter_listing(url, page_size, sort_column, sort_direction, params)
+
+    async def list_docs(self, col_id):
+        """Helper function to list all documents in a given collection
+        :param col_id: Collection ID
+        :return: A dict with listing the collections
+        """
+        url = f"{self.base_url}/collections/{col_id}/list"
+        response = await self._request("GET", url)
+        return response.json()
+
+    async def get_doc_md(self, doc_id, col_id):
+        """Helper function to interact with TRANSKRIBUS document metadata endpoint
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: A dict with basic metadata of a transkribus Document
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/metadata"
+        response = await self._request("GET", url)
+        return response.json()
+
+    async def get_doc_overview_md(self, doc_id, col_id):
+        """Helper function to interact with TRANSKRIBUS document endpoint
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: A dict with basic metadata of a transkribus Document
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+        response = await self._request("GET", url)
+        if response.is_success:
+            result = {}
+            result["trp_return"] = response.json()
+            result["pages"] = _page_summaries(result["trp_return"])
+            return result
+        else:
+            return False
+
+    async def get_fulldoc_md(self, doc_id, col_id, page_id="1"):
+        """Helper function to interact with TRANSKRIBUS document endpoint
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :param page_id: The page number of the Document
+        :return: A dict with basic metadata of a transkribus Document
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/{page_id}"
+        response, extra_info = await asyncio.gather(
+            self._request("GET", url), self.get_doc_md(doc_id, col_id)
+        )
+        if response.is_success:
+            result = {
+                "doc_id": doc_id,
+                "base_url": self.base_url,
+                "col_id": col_id,
+                "page_id": page_id,
+                "session_id": self.login_cookie["JSESSIONID"],
+            }
+            result["doc_url"] = url
+            with self._parse_timer("page", response.content):
+                result.update(_page_md(response.content))
+            result["extra_info"] = extra_info
+            return result
+        else:
+            return False
+
+    async def get_transcript(self, fulldoc_md):
+        """Helper function to fetch the (latest) fulltext of a TRANSKRIBUS page
+        :param fulldoc_md: A dict returned by get_fulldoc_md
+        :return: The fulldoc_md dict with additional keys 'page_xml' and 'transcript'
+        """
+        md = fulldoc_md
+        response = await self._request("GET", md["transcript_url"])
+        if response.is_success:
+            with self._parse_timer("page_xml", response.content):
+                md["page_xml"], md["transcript"] = _transcript_lines(response.content)
+            return md
+        else:
+            return False
+
+    async def iter_doc_transcripts(self, doc_id, col_id):
+        """Fetches the (latest) fulltext of all pages of a TRANSKRIBUS Document with one
+        request to the fulldoc endpoint plus one concurrent request per page
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: An async generator of (page_nr, lines) tuples in order of completion;\
+        lines is an empty list for pages without transcript and None if the fetch failed
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+        response = await self._request("GET", url)
+        if not response.is_success:
+            logger.warning("failed to fetch DOC-ID: %s in COLLECTION: %s", doc_id, col_id)
+            return
+
+        async def fetch_lines(page_nr, transcript_url):
+            if transcript_url is None:
+                return page_nr, []
+            try:
+                res = await self._request("GET", transcript_url)
+            except httpx.HTTPError as e:
+                logger.warning(
+                    "failed to fetch transcript of page %s of DOC-ID: %s due to ERROR: %s", page_nr, doc_id, e
+                )
+                return page_nr, None
+            if not res.is_success:
+                return page_nr, None
+            with self._parse_timer("page_xml", res.content):
+                return page_nr, _transcript_lines(res.content)[1]
+
+        pages = _latest_transcript_urls(response.json())
+        for task in asyncio.as_completed([fetch_lines(*x) for x in pages]):
+            yield await task
+
+    async def list_documents(self, col_id):
+        """Helper function to interact with TRANSKRIBUS collection endpoint to list all documents
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :return: A dict with the default TRANSKRIBUS API return
+        """
+        url = f"{self.base_url}/collections/{col_id}/list"
+        response = await self._request("GET", url)
+        if response.is_success:
+            return response.json()
+        else:
+            return False
+
+    async def get_mets(self, doc_id, col_id):
+        """Get METS file from Document
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: A dict with an lxml object of the mets file and the doc_id
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/mets"
+        response = await self._request("GET", url)
+        if response.is_success:
+            with self._parse_timer("mets", response.content):
+                doc_xml = ET.fromstring(response.content)
+            return {"doc_xml": doc_xml, "doc_id": doc_id}
+        else:
+            return {"doc_xml": None, "doc_id": doc_id}
+
+    async def save_mets_to_file(self, doc_id, col_id, file_path="."):
+        """Saves the METS file of a Document
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: The full filename
+        """
+        mets_dict = await self.get_mets(doc_id, col_id)
+        file_name = os.path.join(file_path, f"{mets_dict['doc_id']}_mets.xml")
+        if mets_dict["doc_xml"] is None:
+            logger.warning("failed to fetch mets for DOC-ID: %s", doc_id)
+            return None
+        if os.path.isdir(file_path):
+            with open(file_name, "wb") as f:
+                f.write(ET.tostring(mets_dict["doc_xml"]))
+            return file_name
+        else:
+            logger.warning("%s does not exist", file_path)
+            return None
+
+    async def get_image_names(self, doc_id, col_id):
+        """Get images names for Document
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: a list of images names
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/imageNames"
+        response = await self._request("GET", url)
+        if response.is_success:
+            return response.text.split("\n")
+        else:
+            return []
+
+    async def save_image_names_to_file(self, doc_id, col_id, file_path="."):
+        """Saves the image names of a Document
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: The full filename
+        """
+        file_list = await self.get_image_names(doc_id, col_id)
+        file_name = os.path.join(file_path, f"{doc_id}_image_name.xml")
+        root = _image_names_to_xml(file_list)
+        if os.path.isdir(file_path):
+            with open(file_name, "wb") as f:
+                f.write(ET.tostring(root))
+            return file_name
+        else:
+            logger.warning("%s does not exist", file_path)
+            return None
+
+    async def search_for_document(self, title, col_id):
+        """Searches for a document with given title in a collection
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param title: Title of the document
+        """
+        res = await self._request(
+            "GET",
+            f"{self.base_url}/collections/findDocuments",
+            params={"collId": col_id, "title": title},
+        )
+        return res.json()
+
+    async def _title_index(self, col_id):
+        """returns the set of normalized titles of all documents in a collection,
+        built once from list_docs
+        """
+        async with self._title_index_lock:
+            if f"{col_id}" not in self._title_indexes:
+                self._title_indexes[f"{col_id}"] = {
+                    _normalize_title(x["title"]) for x in await self.list_docs(col_id)
+                }
+            return self._title_indexes[f"{col_id}"]
+
+    async def document_exists(self, title, col_id):
+        """Checks if a document with given title exists in a collection by looking it up
+        in a local index of the collection's titles, built once from list_docs
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param title: Title of the document
+        """
+        return _normalize_title(title) in await self._title_index(col_id)
+
+    def refresh_title_index(self, col_id=None):
+        """Drops the local title index of a collection (or of all collections)
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        """
+        if col_id is None:
+            self._title_indexes.clear()
+        else:
+            self._title_indexes.pop(f"{col_id}", None)
+
+    async def _reserve_title(self, title, col_id):
+        """adds a title to the title index of a collection before its document is
+        uploaded, so concurrent uploads of the same title are not both sent
+        :return: False if the title is already in the index
+        """
+        index = await self._title_index(col_id)
+        title = _normalize_title(title)
+        # # no await between the check and the add, so no other task can interleave
+        if title in index:
+            return False
+        index.add(title)
+        return True
+
+    def _release_title(self, title, col_id):
+        """removes a title reserved by _reserve_title after its upload failed"""
+        self._title_indexes.get(f"{col_id}", set()).discard(_normalize_title(title))
+
+    async def search_for_collection(self, title):
+        """Searches for a collection by title
+        :param title: Title of the TRANSKRIBUS Collection
+        """
+        res = await self._request(
+            "GET",
+            f"{self.base_url}/collections/listByName",
+            params={"name": title},
+            headers={"Accept": "application/json"},
+        )
+        return res.json()
+
+    async def create_collection(self, title):
+        """Creates a new collection and returns the collectionId
+        :param title: Title of the TRANSKRIBUS Collection
+        """
+        res = await self._request(
+            "POST",
+            f"{self.base_url}/collections/createCollection",
+            params={"collName": title},
+        )
+        if res.status_code == 200:
+            return res.content.decode("utf8")
+        else:
+            logger.warning("error: %s %s", res.status_code, res.content)
+            return False
+
+    async def get_or_create_collection(self, title):
+        """Get or create TRANSKRIBUS collection ID; resolved IDs are memoized, the memo is
+        prewarmed once from list_collections and concurrent calls for the same title
+        never create the collection twice
+        :param title: Title of the TRANSKRIBUS Collection
+        """
+        async with self._collection_ids_lock:
+            if self._collection_ids is None:
+                self._collection_ids = {
+                    x["colName"]: x["colId"] for x in await self.list_collections()
+                }
+            if title in self._collection_ids:
+                return self._collection_ids[title]
+            title_lock = self._collection_title_locks.setdefault(title, asyncio.Lock())
+        async with title_lock:
+            if title in self._collection_ids:
+                return self._collection_ids[title]
+            col = await self.search_for_collection(title=title)
+            if len(col) == 0:
+                col_id = await self.create_collection(title=title)
+            else:
+                col_id = col[0]["colId"]
+            if col_id:
+                self._collection_ids[title] = col_id
+            return col_id
+
+    async def upload_mets_file_from_url(self, mets_url, col_id, better_images=False):
+        """Takes an URL to a METS file and posts that URL to Transkribus
+        :param mets_url: URL of the METS file
+        :param col_id: Transkribus CollectionID
+        :return: True if the document was created, False if it failed or already exists
+        """
+        return await self._upload_mets_file(mets_url, col_id, better_images) == "uploaded"
+
+    async def _upload_mets_file(self, mets_url, col_id, better_images=False):
+        """uploads a METS file like upload_mets_file_from_url
+        :return: 'uploaded', 'exists' or 'failed'
+        """
+        response = await self._request("GET", mets_url)
+        if not response.is_success:
+            logger.warning("failed to fetch METS file %s: %s", mets_url, response.status_code)
+            return "failed"
+        with self._parse_timer("goobi_mets", response.content):
+            mets = MetsDocument(response.content)
+        doc_title = mets.get_title()
+        if not await self._reserve_title(doc_title, col_id):
+            logger.info(
+                "a document with title: %s already exists in collection %s", doc_title, col_id
+            )
+            return "exists"
+        try:
+            if better_images:
+                mets.replace_img_urls()
+                mets.remove_unresolved_fptrs()
+                files = [("mets", ("mets.xml", mets.to_bytes(), "text/xml"))]
+                res = await self._request(
+                    "POST",
+                    f"{self.base_url}/collections/{col_id}/createDocFromMets",
+                    params={"colId": col_id},
+                    files=files,
+                )
+            else:
+                res = await self._request(
+                    "POST",
+                    f"{self.base_url}/collections/{col_id}/createDocFromMetsUrl",
+                    params={"fileName": mets_url},
+                )
+        except BaseException:
+            self._release_title(doc_title, col_id)
+            raise
+        if res.status_code == 200:
+            return "uploaded"
+        else:
+            self._release_title(doc_title, col_id)
+            logger.warning("Error: %s %s", res.status_code, res.content)
+            return "failed"
+
+    async def iter_upload_mets_files_from_goobi(
+        self, file_titles, check_name=True, col_regex=None, col_id=None, max_workers=4
+    ):
+        """Uploads all file_ids from Goobi via METS in Transkribus and yields the outcome
+        of each upload as soon as it is done, see\
+        ACDHTranskribusUtils.iter_upload_mets_files_from_goobi
+        :param file_titles: Iterable with file titles to upload, consumed lazily
+        :param max_workers: Number of uploads running concurrently
+        :return: An async generator of (file_title, status) tuples; status is 'uploaded',\
+        'exists' or 'failed'
+        """
+        if col_regex is None and col_id is None:
+            raise AttributeError("You need to specify either col_regex or col_id")
+        pattern = re.compile(col_regex) if col_id is None else False
+
+        async def upload(f):
+            f_col_id = col_id
+            if pattern:
+                col_name = pattern.match(f)
+                f_col_id = await self.get_or_create_collection(col_name.group())
+            if check_name and await self.document_exists(f, f_col_id):
+                return "exists"
+            return await self._upload_mets_file(self.goobi_base_url.format(f), col_id=f_col_id)
+
+        async for f, status, e in bounded_map_async(upload, file_titles, max_workers):
+            if e is not None:
+                logger.warning("failed to upload %s due to ERROR: %s", f, e)
+                status = "failed"
+            yield f, status
+
+    async def upload_mets_files_from_goobi(
+        self, file_titles, check_name=True, col_regex=None, col_id=None, max_workers=4
+    ):
+        """Uploads all file_ids from Goobi via METS in Transkribus; max_workers uploads
+        run concurrently
+        :param file_titles: Array with file titles to upload
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param check_name (boolean): If set to True checks first if file exist and omits upload if file already exists
+        :param col_regex: regex to be used to create collection from file name
+        :param max_workers: Number of uploads running concurrently
+        :return: A dict mapping each file title to its status, see\
+        iter_upload_mets_files_from_goobi
+        """
+        return {
+            f: status
+            async for f, status in self.iter_upload_mets_files_from_goobi(
+                file_titles,
+                check_name=check_name,
+                col_regex=col_regex,
+                col_id=col_id,
+                max_workers=max_workers,
+            )
+        }
+
+    async def upload_iiif_from_url(self, iiif_url, col_id):
+        """Takes an URL to a IIIF Manifest and posts that URL to Transkribus
+        :param iiif_url: URL of the IIIF Manifest
+        :param col_id: Transkribus CollectionID
+        """
+        manifest = await self._request("GET", iiif_url)
+        doc_title = iiif_url
+        if manifest.status_code == 200:
+            doc_title = manifest.json().get("label", iiif_url)
+        if not await self._reserve_title(doc_title, col_id):
+            logger.info(
+                "a document with title: %s already exists in collection %s", doc_title, col_id
+            )
+            return False
+        try:
+            res = await self._request(
+                "POST",
+                f"{self.base_url}/collections/{col_id}/createDocFromIiifUrl",
+                params={"fileName": iiif_url},
+            )
+        except BaseException:
+            self._release_title(doc_title, col_id)
+            raise
+        if res.status_code == 200:
+            return True
+        else:
+            self._release_title(doc_title, col_id)
+            logger.warning("Error: %s %s", res.status_code, res.content)
+            return False
+
+    async def run_htr(
+        self,
+        col_id: int | str,
+        doc_id: int | str,
+        start_page: int = 1,
+        end_page: None | int = None,
+        model_id: int = 51170,
+    ):
+        """starts htr with the given params and returns the job ID"""
+        if end_page:
+            pages = f"{start_page}-{end_page}"
+        else:
+            pages = f"{start_page}"
+        res = await self._request(
+            "POST",
+            f"{self.base_url}/recognition/{col_id}/{model_id}/trhtr",
+            params={"id": doc_id, "pages": pages},
+        )
+        if res.status_code == 200:
+            job_id = res.text
+            logger.info("started HTR for DOC-ID: %s with JOB-ID %s", doc_id, job_id)
+            return job_id
+        else:
+            logger.warning("failed to start HTR for DOC-ID: %s: %s", doc_id, res.status_code)
+
+    async def get_job_status(self, job_id):
+        """Helper function to interact with TRANSKRIBUS jobs endpoint
+        :param job_id: The ID of a job, e.g. returned by run_htr
+        :return: A dict with the status of the job
+        """
+        response = await self._request("GET", f"{self.base_url}/jobs/{job_id}")
+        if response.is_success:
+            return response.json()
+        else:
+            return False
+
+    async def iter_run_htr(
+        self,
+        docs,
+        model_id=51170,
+        max_in_flight=4,
+        min_interval=2,
+        max_interval=60,
+        fetch_transcripts=False,
+        max_failed_polls=10,
+    ):
+        """Runs HTR for many documents keeping at most max_in_flight jobs running, see
+        ACDHTranskribusUtils.iter_run_htr
+        :return: An async generator of dicts with the keys 'col_id', 'doc_id', 'job_id',\
+        'state' and 'status' ('transcripts' with fetch_transcripts)
+        """
+        docs = iter(docs)
+        poller = JobPoller(min_interval, max_interval, max_failed_polls=max_failed_polls)
+        exhausted = False
+        while True:
+            while not exhausted and len(poller) < max_in_flight:
+                doc = next(docs, None)
+                if doc is None:
+                    exhausted = True
+                    break
+                job = {"col_id": doc[0], "doc_id": doc[1]}
+                try:
+                    job_id = await self.run_htr(*doc, model_id=model_id)
+                except httpx.HTTPError as e:
+                    logger.warning("failed to start HTR for DOC-ID: %s due to ERROR: %s", doc[1], e)
+                    job_id = None
+                if job_id is None:
+                    yield {**job, "job_id": None, "state": "FAILED", "status": None}
+                    continue
+                poller.add(job_id, {**job, "job_id": job_id})
+            if not len(poller):
+                return
+            job_id, wait = poller.next_due()
+            await asyncio.sleep(wait)
+            try:
+                status = await self.get_job_status(job_id)
+            except httpx.HTTPError as e:
+                logger.warning("failed to fetch the status of JOB-ID %s due to ERROR: %s", job_id, e)
+                status = False
+            job = poller.update(job_id, job_state(status))
+            if job is None:
+                continue
+            # # a job without state was given up after max_failed_polls failed polls
+            job["state"], job["status"] = job_state(status) or "FAILED", status or None
+            if fetch_transcripts and job["state"] == "FINISHED":
+                job["transcripts"] = {
+                    page_nr: lines
+                    async for page_nr, lines in self.iter_doc_transcripts(
+                        job["doc_id"], job["col_id"]
+                    )
+                }
+            yield job
+
+    async def aclose(self):
+        """closes the underlying connection pool"""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        self.login_cookie = await self.login(self.user, self._password)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def __init__(
+        self,
+        user=None,
+        password=None,
+        transkribus_base_url=base_url,
+        goobi_base_url=None,
+        max_concurrency=20,
+        timeout=120,
+        transport=None,
+        hooks=None,
+    ) -> None:
+        """
+        :param max_concurrency: max number of requests in flight at the same time
+        :param timeout: timeout in seconds used for all requests
+        :param transport: a transport.TransportPolicy with the retry, rate limit and\
+        circuit breaker settings used for all requests
+        :param hooks: callables receiving an event dict for each request and parsed XML\
+        response, see ACDHTranskribusUtils
+        """
+        if httpx is None:
+            raise ImportError(
+                "AsyncACDHTranskribusUtils requires httpx, install it with "
+                "'pip install acdh-transkribus-utils[async]'"
+            )
+        if user is None:
+            user = os.environ.get("TRANSKRIBUS_USER", None)
+            if user is None:
+                raise AttributeError(
+                    "Transkribus username needs to be set in environments or in init"
+                )
+        if password is None:
+            password = os.environ.get("TRANSKRIBUS_PASSWORD", None)
+            if password is None:
+                raise AttributeError(
+                    "Transkribus password needs to be set in environments or in init"
+                )
+        if transkribus_base_url is None:
+            transkribus_base_url = os.environ.get("TRANSKRIBUS_BASE_URL", None)
+            if transkribus_base_url is None:
+                raise AttributeError(
+                    "Transkribus Base Url needs to be set in environment or init"
+                )
+        if goobi_base_url is None:
+            goobi_base_url = os.environ.get("GOOBI_BASE_URL", None)
+        self.user = user
+        self._password = password
+        self.base_url = transkribus_base_url
+        self.login_cookie = None
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.transport = transport if transport is not None else TransportPolicy()
+        self.hooks = list(hooks) if hooks is not None else []
+        self._collection_ids = None
+        self._collection_ids_lock = asyncio.Lock()
+        self._collection_title_locks = {}
+        self._title_indexes = {}
+        self._title_index_lock = asyncio.Lock()
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+        )
+        if goobi_base_url is not None:
+            self.goobi_base_url = goobi_base_url + "?id={}"
+        else:
+            self.goobi_base_url = None
@@ -0,0 +1,192 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# seconds a cached response is served without asking the server; afterwards it is
+# revalidated with a conditional GET. Transcripts on the file server are stored
+# under immutable keys, so they never need revalidation.
+DEFAULT_TTLS = {
+    r"files\.transkribus\.eu/": 30 * 24 * 3600,
+    r"/collections/list$": 0,
+    r"/collections/[^/]+/list$": 0,
+    r"/fulldoc$": 0,
+    r"/metadata$": 0,
+    r"/mets$": 0,
+    r"/imageNames$": 0,
+}
+STORED_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+
+class HTTPCache:
+    """persistent cache for GET responses stored in a SQLite database, evicted
+    least recently used first once max_size is exceeded. The total size is summed up
+    once when the cache is opened and then kept in memory; access times of cache hits
+    are buffered and written in batches, before an eviction and by flush or close
+
+    :param path: path of the SQLite file; the cache is meant for a single\
+    TRANSKRIBUS user since responses depend on the user's permissions
+    :param max_size: max size of all cached bodies in bytes
+    :param ttls: dict mapping a regex matched against the URL to a TTL in seconds;\
+    the first matching regex wins, URLs without match use default_ttl
+    :param default_ttl: TTL in seconds for URLs not matching any of ttls
+    :param access_batch_size: number of buffered access times written at once
+    """
+
+    def __init__(
+        self,
+        path,
+        max_size=512 * 1024 * 1024,
+        ttls=None,
+        default_ttl=0,
+        access_batch_size=100,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.access_batch_size = access_batch_size
+        self.ttls = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (DEFAULT_TTLS if ttls is None else ttls).items()
+        ]
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    headers TEXT,
+                    body BLOB,
+                    size INTEGER,
+                    stored_at REAL,
+                    accessed_at REAL
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        # # key -> time of the last cache hit, not yet written to the database
+        self._accessed = {}
+
+    def key(self, url, params=None):
+        """returns the cache key of a GET request"""
+        if params:
+            return f"{url}?{urlencode(sorted(params.items()))}"
+        return url
+
+    def ttl(self, url):
+        """returns the TTL in seconds configured for url"""
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key):
+        """returns the cached entry for key or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._accessed[key] = time.time()
+                if len(self._accessed) >= self.access_batch_size:
+                    with self._db:
+                        self._write_accessed()
+        return row
+
+    def is_fresh(self, entry, url):
+        """checks if entry may be served without revalidation"""
+        return time.time() - entry["stored_at"] < self.ttl(url)
+
+    def conditional_headers(self, entry):
+        """returns the If-None-Match/If-Modified-Since headers to revalidate entry"""
+        stored = json.loads(entry["headers"])
+        headers = {}
+        if "ETag" in stored:
+            headers["If-None-Match"] = stored["ETag"]
+        if "Last-Modified" in stored:
+            headers["If-Modified-Since"] = stored["Last-Modified"]
+        return headers
+
+    def store(self, key, response):
+        """stores a successful response and evicts old entries if needed"""
+        headers = {x: response.headers[x] for x in STORED_HEADERS if x in response.headers}
+        body = response.content
+        now = time.time()
+        with self._lock, self._db:
+            old = self._db.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(headers), body, len(body), now, now),
+            )
+            self._accessed.pop(key, None)
+            self._size += len(body) - (old["size"] if old is not None else 0)
+            self._evict()
+
+    def revalidated(self, key):
+        """marks entry as fresh after the server answered 304 Not Modified"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key)
+            )
+
+    def _write_accessed(self):
+        self._db.executemany(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+        )
+        self._accessed.clear()
+
+    def _evict(self):
+        if self._size <= self.max_size:
+            return
+        self._write_accessed()
+        # # only the least recently used rows needed to get below max_size are read
+        evicted = []
+        excess = self._size - self.max_size
+        for row in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if excess <= 0:
+                break
+            evicted.append((row["key"],))
+            excess -= row["size"]
+            self._size -= row["size"]
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def flush(self):
+        """writes the buffered access times of cache hits to the database"""
+        with self._lock, self._db:
+            self._write_accessed()
+
+    def clear(self):
+        """removes all cached responses"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
+            self._accessed.clear()
+            self._size = 0
+
+    def close(self):
+        """writes the buffered access times and closes the database connection"""
+        self.flush()
+        self._db.close()
+
+    def to_response(self, entry, url):
+        """builds a requests.Response from a cached entry"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(json.loads(entry["headers"]))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry["body"]
+        return response
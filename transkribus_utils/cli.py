@@ -1,7 +1,29 @@
+import logging
+import os
+
 import click
 from transkribus_utils import ACDHTranskribusUtils
 
 
+def read_titles(file_path, skip=frozenset()):
+    """yields the stripped, non empty lines of file_path which are not in skip"""
+    with open(file_path, "r") as inp:
+        for line in inp:
+            title = line.strip()
+            if title and title not in skip:
+                yield title
+
+
+def read_journal(journal_path):
+    """returns the titles recorded as done in a journal written by
+    import_goobi_mets_to_transkribus
+    """
+    if not os.path.isfile(journal_path):
+        return set()
+    with open(journal_path, "r") as f:
+        return {line.split("\t")[0] for line in f if line.strip()}
+
+
 @click.command()
 @click.option("-f", "--file-path", help="Path of the file containing the file titles")
 @click.option("-r", "--regex", default=None, help="Regex for creation of collections")
@@ -20,6 +42,20 @@ from transkribus_utils import ACDHTranskribusUtils
     default=None,
     help="Goobi viewer base url if not specified in Env",
 )
+@click.option(
+    "--journal",
+    default=None,
+    help="Path of the journal recording finished titles, defaults to '<file-path>.journal'",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Skip titles already recorded as finished in the journal",
+)
+@click.option(
+    "-w", "--workers", default=1, type=int, help="Number of concurrent uploads"
+)
 def import_goobi_mets_to_transkribus(
     file_path,
     regex=None,
@@ -28,21 +64,38 @@ def import_goobi_mets_to_transkribus(
     password=None,
     transkribus_base_url=None,
     goobi_base_url=None,
+    journal=None,
+    resume=False,
+    workers=1,
 ):
+    if regex is None and colid is None:
+        raise AttributeError("You need to either specify a regex or a collectionid")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     transkr_utils = ACDHTranskribusUtils(
         user=user,
         password=password,
         transkribus_base_url=transkribus_base_url,
         goobi_base_url=goobi_base_url,
     )
-    with open(file_path, "r") as inp:
-        inp_lns = [x.strip() for x in inp.readlines()]
-        if regex is not None:
-            transkr_utils.upload_mets_files_from_goobi(inp_lns, col_regex=regex)
-        elif colid is not None:
-            transkr_utils.upload_mets_files_from_goobi(inp_lns, col_id=colid)
-        else:
-            raise AttributeError("You need to either specify a regex or a collectionid")
+    journal = journal or f"{file_path}.journal"
+    done = read_journal(journal) if resume else set()
+    if done:
+        print(f"resuming, skipping {len(done)} finished titles")
+    titles = read_titles(file_path, skip=done)
+    # # the journal is only ever appended to, so a run without --resume keeps the checkpoint
+    with open(journal, "a") as log:
+        results = transkr_utils.iter_upload_mets_files_from_goobi(
+            titles,
+            col_regex=regex,
+            col_id=colid if regex is None else None,
+            max_workers=workers,
+        )
+        for title, status in results:
+            print(f"{title}: {status}")
+            # failed titles are not recorded, so a resumed run retries them
+            if status != "failed":
+                log.write(f"{title}\t{status}\n")
+                log.flush()
 
 
 if __name__ == "__main__":
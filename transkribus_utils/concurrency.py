@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def bounded_map(func, iterable, max_workers=1):
+    """applies func to every item of iterable with at most max_workers threads
+    and yields the results as they complete; the iterable is consumed lazily so
+    only a bounded number of items is in flight at any time
+    :param func: a callable taking one item
+    :param iterable: the items to process
+    :param max_workers: number of worker threads, 1 processes the items in order
+    :return: a generator of (item, result, exception) tuples
+    """
+    if max_workers <= 1:
+        for item in iterable:
+            try:
+                yield item, func(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+    items = iter(iterable)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {
+            executor.submit(func, item): item
+            for item in itertools.islice(items, max_workers * 2)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                for next_item in itertools.islice(items, 1):
+                    pending[executor.submit(func, next_item)] = next_item
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+
+async def bounded_map_async(func, iterable, max_workers=1):
+    """asyncio variant of bounded_map: runs the coroutine function func for every item
+    of iterable with at most max_workers running at once and yields the results as
+    they complete
+    :param func: a coroutine function taking one item
+    :param iterable: the items to process, consumed lazily
+    :param max_workers: number of items processed concurrently
+    :return: an async generator of (item, result, exception) tuples
+    """
+    items = iter(iterable)
+    pending = {
+        asyncio.ensure_future(func(item)): item
+        for item in itertools.islice(items, max(max_workers, 1))
+    }
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item = pending.pop(task)
+                for next_item in itertools.islice(items, 1):
+                    pending[asyncio.ensure_future(func(next_item))] = next_item
+                try:
+                    yield item, task.result(), None
+                except Exception as e:
+                    yield item, None, e
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def iter_paged(fetch_page, page_size):
+    """yields the items of a paged listing, fetching the next page in a background
+    thread while the current one is consumed, so at most two pages are held in memory;
+    the listing ends with a page shorter than page_size or with a page identical to
+    the previous one, which is what a server ignoring the paging params returns
+    :param fetch_page: a callable taking the index of the first item and returning\
+    a list of items starting at that index
+    :param page_size: number of items requested per page
+    :return: a generator of the items of all pages
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        index = 0
+        previous = None
+        future = executor.submit(fetch_page, index)
+        while True:
+            items = future.result()
+            if items == previous:
+                return
+            if len(items) < page_size:
+                yield from items
+                return
+            # # servers may return more items than requested, continue after the last one
+            index += len(items)
+            future = executor.submit(fetch_page, index)
+            yield from items
+            previous = items
@@ -0,0 +1,68 @@
+import time
+
+FINAL_JOB_STATES = ("FINISHED", "FAILED", "CANCELED")
+
+
+def job_state(status):
+    """returns the state of a job status returned by the jobs endpoint, None if the
+    status could not be fetched
+    """
+    if not status:
+        return None
+    return status.get("state")
+
+
+class JobPoller:
+    """schedules the status polls of running jobs: a job is first polled min_interval
+    seconds after it was started; each poll which does not change its state multiplies
+    the interval by factor up to max_interval, a change resets it to min_interval. A job
+    whose status could not be fetched max_failed_polls times in a row is given up
+
+    :param min_interval: seconds between the first polls of a job
+    :param max_interval: max seconds between two polls of a job
+    :param factor: growth of the interval while the state of a job does not change
+    :param max_failed_polls: consecutive failed polls after which a job is given up
+    """
+
+    def __init__(self, min_interval=2, max_interval=60, factor=1.5, max_failed_polls=10):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.max_failed_polls = max_failed_polls
+        # # job_id -> [next poll, interval, last state, info, consecutive failed polls]
+        self._jobs = {}
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def add(self, job_id, info):
+        """registers a started job; info is returned once the job is done"""
+        self._jobs[job_id] = [
+            time.monotonic() + self.min_interval,
+            self.min_interval,
+            None,
+            info,
+            0,
+        ]
+
+    def next_due(self):
+        """returns the job_id of the job to poll next and the seconds to wait for it"""
+        job_id, job = min(self._jobs.items(), key=lambda x: x[1][0])
+        return job_id, max(0, job[0] - time.monotonic())
+
+    def update(self, job_id, state):
+        """records the polled state of a job, None if the status could not be fetched
+        :return: the info of the job if it reached a final state or was given up, else None
+        """
+        job = self._jobs[job_id]
+        job[4] = job[4] + 1 if state is None else 0
+        if state in FINAL_JOB_STATES or job[4] >= self.max_failed_polls:
+            del self._jobs[job_id]
+            return job[3]
+        if state != job[2] and state is not None:
+            job[1] = self.min_interval
+        else:
+            job[1] = min(self.max_interval, job[1] * self.factor)
+        job[2] = state
+        job[0] = time.monotonic() + job[1]
+        return None
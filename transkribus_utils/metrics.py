@@ -0,0 +1,128 @@
+import logging
+import re
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("transkribus_utils")
+
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_name(url, base_url=""):
+    """returns the endpoint of url with numeric path segments replaced by '{id}', e.g.
+    '/collections/{id}/{id}/fulldoc'; URLs outside base_url keep their host
+    """
+    if base_url and url.startswith(base_url):
+        path = urlsplit(url[len(base_url):]).path
+    else:
+        parts = urlsplit(url)
+        path = f"{parts.netloc}{parts.path}"
+    return ID_SEGMENT.sub("/{id}", path)
+
+
+def response_size(response, stream=False):
+    """returns the size of a response body as sent by the server, None if unknown"""
+    size = response.headers.get("Content-Length")
+    if size is not None:
+        return int(size)
+    if not stream:
+        return len(response.content)
+    return None
+
+
+def emit(hooks, event):
+    """passes an event (a dict with at least the key 'event') to the logger of this
+    package at DEBUG level and to each hook; errors of hooks are logged, not raised
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s", event, extra={"transkribus_event": event})
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            logger.exception("instrumentation hook %r failed", hook)
+
+
+class MetricsCollector:
+    """a hook aggregating request and parse events into counters per endpoint, which
+    can be exposed in the OpenMetrics text format
+
+    usage:
+        metrics = MetricsCollector()
+        client = ACDHTranskribusUtils(hooks=[metrics])
+        ...
+        print(metrics.to_openmetrics())
+    """
+
+    def __init__(self, prefix="transkribus"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # # (method, endpoint, status) -> [count, seconds, bytes, retries]
+        self.requests = defaultdict(lambda: [0, 0.0, 0, 0])
+        # # (endpoint, result) -> count
+        self.cache = defaultdict(int)
+        # # kind -> [count, seconds, bytes]
+        self.parses = defaultdict(lambda: [0, 0.0, 0])
+
+    def __call__(self, event):
+        with self._lock:
+            if event["event"] == "request":
+                key = (event["method"], event["endpoint"], f"{event['status']}")
+                counters = self.requests[key]
+                counters[0] += 1
+                counters[1] += event["elapsed"]
+                counters[2] += event["bytes"] or 0
+                counters[3] += event["retries"] or 0
+            elif event["event"] == "cache":
+                self.cache[(event["endpoint"], event["result"])] += 1
+            elif event["event"] == "parse":
+                counters = self.parses[event["kind"]]
+                counters[0] += 1
+                counters[1] += event["elapsed"]
+                counters[2] += event["bytes"] or 0
+
+    def summary(self):
+        """returns the number of requests, seconds, bytes and retries per endpoint over
+        all statuses, failed requests included, sorted by the total time spent
+        """
+        endpoints = defaultdict(lambda: {"requests": 0, "seconds": 0.0, "bytes": 0, "retries": 0})
+        with self._lock:
+            for (method, endpoint, _), (count, seconds, size, retries) in self.requests.items():
+                x = endpoints[f"{method} {endpoint}"]
+                x["requests"] += count
+                x["seconds"] += seconds
+                x["bytes"] += size
+                x["retries"] += retries
+        return dict(sorted(endpoints.items(), key=lambda x: -x[1]["seconds"]))
+
+    def to_openmetrics(self):
+        """returns the counters in the OpenMetrics text exposition format"""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            requests = sorted(self.requests.items())
+            cache = sorted(self.cache.items())
+            parses = sorted(self.parses.items())
+        lines.append(f"# TYPE {p}_requests counter")
+        lines.append(f"# TYPE {p}_request_duration_seconds summary")
+        lines.append(f"# TYPE {p}_response_bytes counter")
+        lines.append(f"# TYPE {p}_request_retries counter")
+        for (method, endpoint, status), (count, seconds, size, retries) in requests:
+            labels = f'method="{method}",endpoint="{endpoint}",status="{status}"'
+            lines.append(f"{p}_requests_total{{{labels}}} {count}")
+            lines.append(f"{p}_request_duration_seconds_sum{{{labels}}} {seconds}")
+            lines.append(f"{p}_request_duration_seconds_count{{{labels}}} {count}")
+            lines.append(f"{p}_response_bytes_total{{{labels}}} {size}")
+            lines.append(f"{p}_request_retries_total{{{labels}}} {retries}")
+        lines.append(f"# TYPE {p}_cache_lookups counter")
+        for (endpoint, result), count in cache:
+            lines.append(f'{p}_cache_lookups_total{{endpoint="{endpoint}",result="{result}"}} {count}')
+        lines.append(f"# TYPE {p}_parse_duration_seconds summary")
+        lines.append(f"# TYPE {p}_parsed_bytes counter")
+        for kind, (count, seconds, size) in parses:
+            lines.append(f'{p}_parse_duration_seconds_sum{{kind="{kind}"}} {seconds}')
+            lines.append(f'{p}_parse_duration_seconds_count{{kind="{kind}"}} {count}')
+            lines.append(f'{p}_parsed_bytes_total{{kind="{kind}"}} {size}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
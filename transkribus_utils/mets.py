@@ -1,5 +1,10 @@
+from collections import defaultdict
+
+import lxml.etree as ET
 from acdh_xml_pyutils.xml import XMLReader
 
+from .xpaths import METS_NS, METS_NSMAP, MODS_NS, MODS_TITLE, XLINK_NS
+
 GOOBI_IIIF_PATTERN = "https://viewer.acdh.oeaw.ac.at/viewer/api/v1/records/{}/files/images/{}/full/full/0/default.jpg"  # noqa
 
 
@@ -8,49 +13,179 @@ def make_nsmap(base_nsmap=None):
     if base_nsmap is None:
         base_nsmap = {}
     nsmap = base_nsmap
-    nsmap["mets"] = "http://www.loc.gov/METS/"
-    nsmap["mods"] = "http://www.loc.gov/mods/v3"
-    nsmap["xlink"] = "http://www.w3.org/1999/xlink"
+    nsmap["mets"] = METS_NS
+    nsmap["mods"] = MODS_NS
+    nsmap["xlink"] = XLINK_NS
     return nsmap
 
 
-def get_title_from_mets(
-    mets_url, title_xpaht=".//mods:title/text()", nsmap=make_nsmap()
+NSMAP = METS_NSMAP
+XLINK_HREF = f"{{{XLINK_NS}}}href"
+METS_FILE_GRP = f"{{{METS_NS}}}fileGrp"
+METS_FILE = f"{{{METS_NS}}}file"
+METS_FLOCAT = f"{{{METS_NS}}}FLocat"
+METS_FPTR = f"{{{METS_NS}}}fptr"
+METS_DIV = f"{{{METS_NS}}}div"
+
+
+def goobi_iiif_url(href, replacement_pattern=GOOBI_IIIF_PATTERN):
+    """builds the URL of an image from the last two path segments of href, e.g.
+    file:///opt/digiverso/viewer/media/{record}/{image}.tif
+    """
+    collection_id, image_id = href.split("/")[-2:]
+    return replacement_pattern.format(collection_id, image_id)
+
+
+def rewrite_img_urls(
+    tree,
+    replacement_pattern=GOOBI_IIIF_PATTERN,
+    source_use="PRESENTATION",
+    target_use="DEFAULT",
 ):
-    doc = XMLReader(mets_url)
-    tree = doc.tree
-    mets_title = tree.xpath(title_xpaht, namespaces=nsmap)[0]
-    return mets_title
+    """points the FLocat of each file in the target fileGrp to a URL derived from the
+    matching file in the source fileGrp. Files are matched through the fptrs of the
+    structMap divs (i.e. by page ORDER) and, for files not referenced there, by their
+    ID with the fileGrp suffix removed (FILE_0001_DEFAULT -> FILE_0001); files without
+    a match are left untouched. All files, FLocats and fptrs are collected in a single
+    pass over the tree.
+    :param tree: the parsed METS
+    :param replacement_pattern: a format string filled with the last two path segments\
+    of the source href, or a callable taking the source href and returning the new URL
+    :param source_use: USE of the fileGrp to take the hrefs from
+    :param target_use: USE of the fileGrp to rewrite
+    :return: the number of rewritten files
+    """
+    if callable(replacement_pattern):
+        new_url = replacement_pattern
+    else:
+
+        def new_url(href):
+            return goobi_iiif_url(href, replacement_pattern)
+
+    uses = {}
+    flocats = defaultdict(list)
+    file_ids_by_div = defaultdict(list)
+    grp_use, file_id, div = None, None, -1
+    # # relies on document order: FLocats follow their file, and fptrs precede the
+    # # child divs of their div as required by the METS schema
+    for element in tree.iter(METS_FILE_GRP, METS_FILE, METS_FLOCAT, METS_FPTR, METS_DIV):
+        tag = element.tag
+        if tag == METS_FLOCAT:
+            if file_id is not None:
+                flocats[file_id].append(element)
+        elif tag == METS_FILE:
+            file_id = element.get("ID") if grp_use in (source_use, target_use) else None
+            if file_id is not None:
+                uses[file_id] = grp_use
+        elif tag == METS_FPTR:
+            file_ids_by_div[div].append(element.get("FILEID"))
+        elif tag == METS_DIV:
+            div += 1
+        else:
+            grp_use = element.get("USE")
+    source_by_target = {}
+    for file_ids in file_ids_by_div.values():
+        sources = [x for x in file_ids if uses.get(x) == source_use]
+        if sources:
+            for x in file_ids:
+                if uses.get(x) == target_use:
+                    source_by_target.setdefault(x, sources[0])
+    sources_by_stem = {
+        x.rsplit("_", 1)[0]: x for x, use in uses.items() if use == source_use
+    }
+    rewritten = 0
+    for target_id, use in uses.items():
+        if use != target_use:
+            continue
+        source_id = source_by_target.get(target_id) or sources_by_stem.get(
+            target_id.rsplit("_", 1)[0]
+        )
+        if source_id is None or not flocats[source_id]:
+            continue
+        url = new_url(flocats[source_id][0].get(XLINK_HREF))
+        for flocat in flocats[target_id]:
+            flocat.set(XLINK_HREF, url)
+        rewritten += 1
+    return rewritten
+
+
+class MetsDocument:
+    """a METS file which is fetched and parsed once and then serves title extraction,
+    image URL rewriting, fptr cleanup and serialization from the same tree
+
+    :param mets: an URL, a file path or a string of a METS file, or the raw bytes of it
+    :param nsmap: namespace map used for the xpath expressions
+    """
+
+    def __init__(self, mets, nsmap=None):
+        if isinstance(mets, bytes):
+            self.tree = ET.fromstring(mets)
+        else:
+            self.tree = XMLReader(mets).tree
+        self.nsmap = nsmap if nsmap is not None else make_nsmap()
+
+    def get_title(self, title_xpath=None):
+        """returns the first mods:title"""
+        if title_xpath is None:
+            return MODS_TITLE(self.tree)[0]
+        return self.tree.xpath(title_xpath, namespaces=self.nsmap)[0]
+
+    def replace_img_urls(self, replacement_pattern=GOOBI_IIIF_PATTERN):
+        """points the DEFAULT images to the full size images of the PRESENTATION files,
+        see rewrite_img_urls
+        :return: the number of rewritten files
+        """
+        return rewrite_img_urls(self.tree, replacement_pattern)
+
+    def remove_unresolved_fptrs(self):
+        """deltes fptr-elemets referencing an id that can't be resolved in the document
+        :return: the number of removed fptr-elements
+        """
+        return remove_unresolved_fptrs(self, nsmap=self.nsmap)
+
+    def to_bytes(self):
+        """returns the document serialized as utf-8 encoded bytes"""
+        return ET.tostring(self.tree, encoding="utf-8")
+
+    def to_string(self):
+        """returns the document serialized as string"""
+        return self.to_bytes().decode("utf-8")
+
+
+def get_title_from_mets(mets_url, title_xpaht=None, nsmap=make_nsmap()):
+    return MetsDocument(mets_url, nsmap=nsmap).get_title(title_xpaht)
 
 
 def remove_unresolved_fptrs(doc: XMLReader, nsmap=make_nsmap()):
-    """deltes fptr-elemets referencing an id that can't be resolved in doc"""
-    # # find all existing fptr FILEID-attribute values
-    fptr_target_ids = doc.tree.xpath("//mets:div/mets:fptr/@FILEID", namespaces=nsmap)
-    # # find all existing IDs of file-elements
-    existing_file_ids = doc.tree.xpath("//mets:fileGrp/mets:file/@ID", namespaces=nsmap)
-    for fptr_target_id in fptr_target_ids:
-        if fptr_target_id not in existing_file_ids:
-            # # remove invalid fptrs
-            fptr_element = fptr_target_id.getparent()
+    """deltes fptr-elemets referencing an id that can't be resolved in doc; file IDs and
+    fptrs are collected in a single pass over the tree, so the runtime is linear
+    :return: the number of removed fptr-elements
+    """
+    file_tag = f"{{{nsmap['mets']}}}file"
+    file_grp_tag = f"{{{nsmap['mets']}}}fileGrp"
+    fptr_tag = f"{{{nsmap['mets']}}}fptr"
+    div_tag = f"{{{nsmap['mets']}}}div"
+    existing_file_ids = set()
+    # # reverse index from FILEID to the fptr-elements pointing to it
+    fptrs_by_file_id = defaultdict(list)
+    for element in doc.tree.iter(file_tag, fptr_tag):
+        parent = element.getparent()
+        if element.tag == file_tag and parent.tag == file_grp_tag:
+            existing_file_ids.add(element.get("ID"))
+        elif element.tag == fptr_tag and parent.tag == div_tag:
+            fptrs_by_file_id[element.get("FILEID")].append(element)
+    removed = 0
+    for file_id in fptrs_by_file_id.keys() - existing_file_ids:
+        for fptr_element in fptrs_by_file_id[file_id]:
             fptr_element.getparent().remove(fptr_element)
+            removed += 1
+    return removed
 
 
 def replace_img_urls_in_mets(
     mets_url, replacement_pattern=GOOBI_IIIF_PATTERN, nsmap=make_nsmap()
 ):
-    doc = XMLReader(mets_url)
-    new_uris = []
-    for x in doc.tree.xpath(
-        ".//mets:fileGrp[@USE='PRESENTATION']//mets:FLocat/@xlink:href",
-        namespaces=nsmap,
-    ):
-        collection_id, image_id = x.split("/")[-2:]
-        new_uri = replacement_pattern.format(collection_id, image_id)
-        new_uris.append(new_uri)
-    for i, x in enumerate(
-        doc.tree.xpath(".//mets:fileGrp[@USE='DEFAULT']//mets:FLocat", namespaces=nsmap)
-    ):
-        x.attrib["{http://www.w3.org/1999/xlink}href"] = new_uris[i]
-    remove_unresolved_fptrs(doc)
-    return doc.return_string()
+    doc = MetsDocument(mets_url, nsmap=nsmap)
+    doc.replace_img_urls(replacement_pattern)
+    doc.remove_unresolved_fptrs()
+    return doc.to_string()
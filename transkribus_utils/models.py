@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+from typing import Callable
+
+
+@dataclass(slots=True)
+class Collection:
+    """a TRANSKRIBUS collection as listed by the collections endpoint"""
+
+    col_id: int
+    name: str
+    nr_of_documents: int | None = None
+
+    @classmethod
+    def from_trp(cls, x):
+        """creates a Collection from an item of the collection list"""
+        return cls(x["colId"], x["colName"], x.get("nrOfDocuments"))
+
+
+@dataclass(slots=True)
+class Document:
+    """a TRANSKRIBUS document; the full metadata payload is only fetched when `raw` is
+    accessed
+    """
+
+    doc_id: int
+    col_id: int
+    title: str
+    nr_of_pages: int | None = None
+    nr_of_transcribed_lines: int | None = None
+    thumb_url: str | None = None
+    _load_raw: Callable | None = field(default=None, repr=False, compare=False)
+    _raw: dict | None = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_trp(cls, x, col_id, load_raw=None):
+        """creates a Document from an item of the document list or a metadata payload"""
+        return cls(
+            x["docId"],
+            col_id,
+            x.get("title"),
+            x.get("nrOfPages"),
+            x.get("nrOfTranscribedLines"),
+            x.get("thumbUrl"),
+            load_raw,
+        )
+
+    @property
+    def raw(self):
+        """the metadata payload of the document, fetched on first access"""
+        if self._raw is None and self._load_raw is not None:
+            self._raw = self._load_raw()
+        return self._raw
+
+
+@dataclass(slots=True)
+class Page:
+    """a page of a TRANSKRIBUS document with its image and latest transcript"""
+
+    doc_id: int
+    col_id: int
+    page_nr: int
+    page_id: int | None = None
+    img_url: str | None = None
+    thumb_url: str | None = None
+    ts_id: int | None = None
+    transcript_url: str | None = None
+
+    @classmethod
+    def from_trp(cls, x, col_id):
+        """creates a Page from an item of the page list of a fulldoc response"""
+        transcripts = x.get("tsList", {}).get("transcripts", [])
+        latest = transcripts[0] if transcripts else {}
+        return cls(
+            x["docId"],
+            col_id,
+            x["pageNr"],
+            x.get("pageId"),
+            x.get("url"),
+            x.get("thumbUrl"),
+            latest.get("tsId"),
+            latest.get("url"),
+        )
+
+
+@dataclass(slots=True)
+class Transcript:
+    """the text lines of a transcript; the PAGE XML tree is only kept if it was loaded
+    with keep_tree, otherwise it is fetched again when `tree` is accessed
+    """
+
+    doc_id: int
+    col_id: int
+    page_nr: int
+    ts_id: int | None
+    url: str
+    lines: tuple = ()
+    _load_tree: Callable | None = field(default=None, repr=False, compare=False)
+    _tree: object = field(default=None, repr=False, compare=False)
+
+    @property
+    def tree(self):
+        """the parsed PAGE XML, fetched on first access unless loaded with keep_tree"""
+        if self._tree is None and self._load_tree is not None:
+            self._tree = self._load_tree()
+        return self._tree
+
+    @property
+    def text(self):
+        """the lines joined by newlines"""
+        return "\n".join(self.lines)
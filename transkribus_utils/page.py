@@ -0,0 +1,39 @@
+import io
+
+import lxml.etree as ET
+
+
+def iter_text_lines(source):
+    """streams the TextLines of a PAGE XML document (any PAGE schema version)
+    without building the whole tree; processed elements are cleared on the fly
+    :param source: the document as bytes or as a binary file-like object
+    :return: a generator of dicts with the keys 'line_id', 'region_id', 'text',\
+    'coords' and 'conf'; 'text' holds the line level TextEquiv
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    context = ET.iterparse(
+        source, events=("end",), tag=("{*}TextLine", "{*}TextRegion")
+    )
+    for _, element in context:
+        if ET.QName(element).localname == "TextLine":
+            region = element.getparent()
+            text, conf, coords = None, None, None
+            for child in element:
+                localname = ET.QName(child).localname
+                if localname == "Coords":
+                    coords = child.get("points")
+                elif localname == "TextEquiv":
+                    conf = child.get("conf")
+                    for unicode in child.iterchildren("{*}Unicode"):
+                        text = unicode.text
+            yield {
+                "line_id": element.get("id"),
+                "region_id": region.get("id") if region is not None else None,
+                "text": text or "",
+                "coords": coords,
+                "conf": float(conf) if conf is not None else None,
+            }
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
@@ -0,0 +1,90 @@
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+LINE_COLUMNS = (
+    "col_id",
+    "doc_id",
+    "page_nr",
+    "region_id",
+    "line_id",
+    "text",
+    "coords",
+    "conf",
+)
+# # IDs may be passed as strings, e.g. from the command line or a URL
+INT_COLUMNS = ("col_id", "doc_id", "page_nr")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError(
+            "exporting to Parquet requires pyarrow, install it with "
+            "'pip install acdh-transkribus-utils[parquet]'"
+        )
+
+
+def line_schema():
+    """returns the Arrow schema of the exported lines, one row per TextLine"""
+    _require_pyarrow()
+    return pa.schema(
+        [
+            ("col_id", pa.int64()),
+            ("doc_id", pa.int64()),
+            ("page_nr", pa.int32()),
+            ("region_id", pa.string()),
+            ("line_id", pa.string()),
+            ("text", pa.string()),
+            ("coords", pa.string()),
+            ("conf", pa.float32()),
+        ]
+    )
+
+
+def iter_line_batches(lines, batch_size=50000):
+    """collects lines into Arrow record batches of at most batch_size rows, so only
+    one batch is held in memory at a time
+    :param lines: iterable of dicts with the keys of LINE_COLUMNS; the values of\
+    INT_COLUMNS are converted with int()
+    :return: a generator of pyarrow.RecordBatch
+    """
+    schema = line_schema()
+    other_columns = [x for x in LINE_COLUMNS if x not in INT_COLUMNS]
+    columns = {x: [] for x in LINE_COLUMNS}
+    rows = 0
+    for line in lines:
+        for key in INT_COLUMNS:
+            columns[key].append(int(line[key]))
+        for key in other_columns:
+            columns[key].append(line[key])
+        rows += 1
+        if rows == batch_size:
+            yield pa.RecordBatch.from_pydict(columns, schema=schema)
+            columns = {x: [] for x in LINE_COLUMNS}
+            rows = 0
+    if rows:
+        yield pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def write_lines_to_parquet(lines, file_name, batch_size=50000, compression="zstd"):
+    """writes lines to a Parquet file in batches of batch_size rows
+    :param lines: iterable of dicts with the keys of LINE_COLUMNS
+    :param file_name: path of the Parquet file, removed again if writing fails
+    :return: the number of written lines
+    """
+    _require_pyarrow()
+    written = 0
+    try:
+        with pq.ParquetWriter(file_name, line_schema(), compression=compression) as writer:
+            for batch in iter_line_batches(lines, batch_size):
+                writer.write_batch(batch)
+                written += batch.num_rows
+    except BaseException:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        raise
+    return written
@@ -0,0 +1,215 @@
+import sqlite3
+import threading
+
+from .page import iter_text_lines
+
+
+def _fts_query(query):
+    """turns a search string into a FTS5 query matching all of its words; a trailing
+    '*' is kept as prefix search, any other FTS5 syntax is escaped
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """local full-text index of transcript lines stored in a SQLite FTS5 table; pages
+    are (re)indexed one at a time, so the index can be updated incrementally. The lines
+    of a page get consecutive rowids and the pages table keeps their range, so pages are
+    replaced, removed and looked up for a hit by rowid instead of scanning the unindexed
+    columns of the FTS5 table
+
+    :param path: path of the SQLite file, ':memory:' for a temporary index
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(
+                """CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5 (
+                    text,
+                    col_id UNINDEXED,
+                    doc_id UNINDEXED,
+                    page_nr UNINDEXED,
+                    region_id UNINDEXED,
+                    line_id UNINDEXED
+                )"""
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    col_id INTEGER,
+                    doc_id INTEGER,
+                    page_nr INTEGER,
+                    version TEXT,
+                    first_rowid INTEGER,
+                    last_rowid INTEGER,
+                    PRIMARY KEY (col_id, doc_id, page_nr)
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS pages_first_rowid ON pages (first_rowid)"
+            )
+
+    def page_version(self, col_id, doc_id, page_nr):
+        """returns the version the page was indexed with or None if it is not indexed"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM pages WHERE col_id = ? AND doc_id = ? AND page_nr = ?",
+                (col_id, doc_id, page_nr),
+            ).fetchone()
+        return row["version"] if row is not None else None
+
+    def doc_ids(self, col_id):
+        """returns the IDs of the indexed documents of a collection"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT doc_id FROM pages WHERE col_id = ?", (col_id,)
+            ).fetchall()
+        return {x["doc_id"] for x in rows}
+
+    def add_page(self, col_id, doc_id, page_nr, lines, version=None):
+        """replaces the indexed lines of a page
+        :param lines: iterable of dicts with the keys 'text', 'region_id' and 'line_id',\
+        e.g. yielded by page.iter_text_lines
+        :param version: identifies the indexed transcript, e.g. its URL
+        """
+        rows = [(x["text"], col_id, doc_id, page_nr, x["region_id"], x["line_id"]) for x in lines]
+        with self._lock, self._db:
+            self._delete_lines(
+                "WHERE col_id = ? AND doc_id = ? AND page_nr = ?", (col_id, doc_id, page_nr)
+            )
+            last = self._db.execute("SELECT rowid FROM lines ORDER BY rowid DESC LIMIT 1").fetchone()
+            first_rowid = (last[0] if last is not None else 0) + 1
+            self._db.executemany(
+                "INSERT INTO lines (rowid, text, col_id, doc_id, page_nr, region_id, line_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((first_rowid + i, *row) for i, row in enumerate(rows)),
+            )
+            # # pages without lines get no rowid range
+            rowids = (first_rowid, first_rowid + len(rows) - 1) if rows else (None, None)
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (col_id, doc_id, page_nr, version, *rowids),
+            )
+
+    def _delete_lines(self, where, params):
+        """deletes the lines of the pages selected by where from the FTS table"""
+        ranges = self._db.execute(f"SELECT first_rowid, last_rowid FROM pages {where}", params)
+        self._db.executemany(
+            "DELETE FROM lines WHERE rowid BETWEEN ? AND ?", ranges.fetchall()
+        )
+
+    def add_page_xml(self, col_id, doc_id, page_nr, content, version=None):
+        """indexes the lines of a PAGE XML document given as bytes or file-like object"""
+        self.add_page(col_id, doc_id, page_nr, iter_text_lines(content), version)
+
+    def remove_doc(self, col_id, doc_id):
+        """removes all pages of a document from the index"""
+        with self._lock, self._db:
+            self._delete_lines("WHERE col_id = ? AND doc_id = ?", (col_id, doc_id))
+            self._db.execute(
+                "DELETE FROM pages WHERE col_id = ? AND doc_id = ?", (col_id, doc_id)
+            )
+
+    @staticmethod
+    def _filter(col_id=None, doc_id=None):
+        """returns SQL conditions and their params restricting the rows to a collection
+        and document
+        """
+        sql = ""
+        params = []
+        if col_id is not None:
+            sql += " AND col_id = ?"
+            params.append(col_id)
+        if doc_id is not None:
+            sql += " AND doc_id = ?"
+            params.append(doc_id)
+        return sql, params
+
+    def search(self, query, col_id=None, doc_id=None):
+        """returns the lines containing all words of query (case insensitive)
+        :param query: the search string, words ending with '*' match as prefix
+        :param col_id: only search the documents of this collection
+        :param doc_id: only search this document
+        :return: a list of dicts with the keys 'col_id', 'doc_id', 'page_nr',\
+        'region_id', 'line_id', 'text' and 'highlight', ordered by document and page
+        """
+        fts_query = _fts_query(query)
+        if not fts_query:
+            return []
+        sql, params = self._filter(col_id, doc_id)
+        sql = f"""SELECT col_id, doc_id, page_nr, region_id, line_id, text,
+            highlight(lines, 0, '<em>', '</em>') AS highlight
+            FROM lines WHERE lines MATCH ?{sql} ORDER BY col_id, doc_id, page_nr, rowid"""
+        with self._lock:
+            rows = self._db.execute(sql, [fts_query, *params]).fetchall()
+        return [dict(x) for x in rows]
+
+    def ft_search(self, **kwargs):
+        """queries the index like ACDHTranskribusUtils.ft_search queries the TRANSKRIBUS
+        fulltext search endpoint; only the lines of the requested pages are highlighted
+        :param kwargs: 'query' holds the search string, 'start' and 'rows' page through\
+        the hits, 'col_id' and 'doc_id' restrict the search; other kwargs are ignored
+        :return: A dict with the keys 'numResults' (the number of matching pages) and\
+        'pageHits', a list of dicts with the keys 'collectionIds', 'docId', 'pageNr',\
+        'highlights', 'regionIds' and 'lineIds'
+        """
+        if not kwargs.get("query"):
+            return False
+        fts_query = _fts_query(kwargs["query"])
+        if not fts_query:
+            return {"numResults": 0, "pageHits": []}
+        start = int(kwargs.get("start", 0))
+        rows = int(kwargs.get("rows", 10))
+        sql, params = self._filter(kwargs.get("col_id"), kwargs.get("doc_id"))
+        # # the page of a matching line is the one with the closest first_rowid below it
+        pages_sql = f"""FROM pages WHERE first_rowid IN (
+            SELECT (
+                SELECT first_rowid FROM pages WHERE first_rowid <= lines.rowid
+                ORDER BY first_rowid DESC LIMIT 1
+            ) FROM lines WHERE lines MATCH ?
+        ){sql}"""
+        params = [fts_query, *params]
+        page_hits = []
+        with self._lock:
+            pages = self._db.execute(
+                f"""SELECT col_id, doc_id, page_nr, first_rowid, last_rowid,
+                COUNT(*) OVER () AS num_results {pages_sql}
+                ORDER BY col_id, doc_id, page_nr LIMIT ? OFFSET ?""",
+                [*params, rows, start],
+            ).fetchall()
+            if pages:
+                num_results = pages[0]["num_results"]
+            elif start > 0:
+                num_results = self._db.execute(f"SELECT COUNT(*) {pages_sql}", params).fetchone()[0]
+            else:
+                num_results = 0
+            for page in pages:
+                lines = self._db.execute(
+                    """SELECT region_id, line_id, highlight(lines, 0, '<em>', '</em>') AS highlight
+                    FROM lines WHERE lines MATCH ? AND rowid BETWEEN ? AND ? ORDER BY rowid""",
+                    (fts_query, page["first_rowid"], page["last_rowid"]),
+                ).fetchall()
+                page_hits.append(
+                    {
+                        "collectionIds": [page["col_id"]],
+                        "docId": page["doc_id"],
+                        "pageNr": page["page_nr"],
+                        "highlights": [x["highlight"] for x in lines],
+                        "regionIds": [x["region_id"] for x in lines],
+                        "lineIds": [x["line_id"] for x in lines],
+                    }
+                )
+        return {"numResults": num_results, "pageHits": page_hits}
+
+    def close(self):
+        """closes the database connection"""
+        self._db.close()
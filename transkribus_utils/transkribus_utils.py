@@ -1,20 +1,311 @@
-import io
+import hashlib
+import json
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import lxml.etree as ET
 import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from urllib.parse import urlsplit
 
-from .mets import get_title_from_mets, replace_img_urls_in_mets
+from .cache import HTTPCache
+from .concurrency import bounded_map, iter_paged
+from .mets import MetsDocument
 from .iiif import get_title_from_iiif
+from .jobs import JobPoller, job_state
+from .metrics import emit, endpoint_name, logger, response_size
+from .models import Collection, Document, Page, Transcript
+from .page import iter_text_lines
+from .parquet import write_lines_to_parquet
+from .transport import TransportPolicy
+from .xpaths import (
+    PAGE_NSMAP,
+    TRP_IMG_URL,
+    TRP_SESSION_ID,
+    TRP_THUMB_URL,
+    TRP_TRANSCRIPT_URL,
+    TRP_TS_ID,
+    page_line_text,
+)
 
 base_url = "https://transkribus.eu/TrpServer/rest"
-nsmap = {"page": "http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"}
+nsmap = PAGE_NSMAP
+iiif_base_url = "https://files.transkribus.eu/iiif/2/{}/full/{}/0/default.jpg"
+files_host = urlsplit(iiif_base_url).netloc
 crowd_base_url = (
     "https://transkribus.eu/r/read/sandbox/application/?colId={}&docId={}&pageId={}"
 )
 
 
+def _normalize_title(title):
+    """collapses whitespace and case of a document title for duplicate checks"""
+    return " ".join(f"{title}".split()).casefold()
+
+
+def _login_cookies(status_code, content, request_url):
+    """parses the response of the login endpoint
+    :return: A dict with the session cookie
+    """
+    if status_code == 200:
+        tree = ET.fromstring(content)
+        sessionid = TRP_SESSION_ID(tree)
+        cookies = dict(JSESSIONID=sessionid[0])
+        return cookies
+    elif status_code == 403:
+        raise Exception(
+            f"Unable to authenticate to the Trancribus-server ({request_url}) with the provided credentials."
+            "\nCheck if you provided the correct username & password."
+            "\nPasswords/usernames containing special characters, spaces etc. may cause this behaviour. "
+            "So you might need to change your password."
+        )
+    else:
+        raise Exception(
+            f"Login at Transcribus-server ({request_url}) failed with unexspected http-status code '{status_code}'."  # noqa
+        )
+
+
+def _page_summaries(trp_return):
+    """returns a short summary of each page listed in a fulldoc response"""
+    page_list = trp_return["pageList"]["pages"]
+    return [
+        {
+            "page_id": x["pageId"],
+            "doc_id": x["docId"],
+            "page_nr": x["pageNr"],
+            "thumb": x["thumbUrl"],
+        }
+        for x in page_list
+    ]
+
+
+def _latest_transcript_urls(trp_return):
+    """returns the page number and the URL of the latest transcript of each page
+    listed in a fulldoc response
+    """
+    pages = []
+    for x in trp_return["pageList"]["pages"]:
+        transcripts = x.get("tsList", {}).get("transcripts", [])
+        url = transcripts[0]["url"] if transcripts else None
+        pages.append((x["pageNr"], url))
+    return pages
+
+
+def _page_images(trp_return, iiif_size=None):
+    """returns the page number, image URL, file name and md5 hash of the image of each
+    page listed in a fulldoc response
+    :param iiif_size: if set, the URL of a scaled IIIF variant of this size (e.g.\
+    '1200,') is returned instead of the original; its md5 hash is unknown
+    """
+    images = []
+    for x in trp_return["pageList"]["pages"]:
+        file_name = x.get("imgFileName") or f"{x['pageNr']:04}.jpg"
+        if iiif_size is None:
+            url, md5 = x["url"], x.get("md5Sum")
+        else:
+            url, md5 = iiif_base_url.format(x["key"], iiif_size), None
+            file_name = f"{os.path.splitext(file_name)[0]}.jpg"
+        images.append(
+            {"page_nr": x["pageNr"], "url": url, "file_name": file_name, "md5": md5}
+        )
+    return images
+
+
+def _file_md5(file_name, chunk_size=1 << 20):
+    """returns the md5 hash of a file, read in chunks"""
+    md5 = hashlib.md5()
+    with open(file_name, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _latest_ts_ids(trp_return):
+    """returns a dict mapping the page number to the ID of the latest transcript of
+    each page listed in a fulldoc response
+    """
+    ts_ids = {}
+    for x in trp_return["pageList"]["pages"]:
+        transcripts = x.get("tsList", {}).get("transcripts", [])
+        ts_ids[x["pageNr"]] = transcripts[0].get("tsId") if transcripts else None
+    return ts_ids
+
+
+def _doc_fingerprint(trp_return):
+    """returns the timestamp and a md5 hash over the latest transcripts and the
+    images of all pages listed in a fulldoc response
+    """
+    timestamps = []
+    parts = []
+    for x in trp_return["pageList"]["pages"]:
+        parts.append(f"{x.get('pageNr')}:{x.get('key')}")
+        transcripts = x.get("tsList", {}).get("transcripts", [])
+        if transcripts:
+            timestamps.append(transcripts[0].get("timestamp", 0))
+            parts.append(f"{transcripts[0].get('md5Sum')}")
+    return {
+        "timestamp": max(timestamps, default=0),
+        "md5": hashlib.md5("|".join(parts).encode("utf-8")).hexdigest(),
+    }
+
+
+def _page_md(content):
+    """parses the response of the page endpoint
+    :return: A dict with the parsed page, the ID of its latest transcript and its\
+    transcript, thumb and image URLs
+    """
+    doc_xml = ET.fromstring(content)
+    ts_id = TRP_TS_ID(doc_xml)
+    return {
+        "doc_xml": doc_xml,
+        "ts_id": int(ts_id[0]) if ts_id else None,
+        "transcript_url": TRP_TRANSCRIPT_URL(doc_xml)[0],
+        "thumb_url": TRP_THUMB_URL(doc_xml)[0],
+        "img_url": TRP_IMG_URL(doc_xml)[0],
+    }
+
+
+def _transcript_lines(content):
+    """parses a PAGE XML document (PAGE 2013 or 2019)
+    :return: The parsed document and a list of the text of its lines
+    """
+    page = ET.fromstring(content)
+    return page, page_line_text(page)
+
+
+def _image_names_to_xml(file_list):
+    """returns a list-element with an item-element for each image name"""
+    root = ET.Element("list")
+    counter = 1
+    for x in file_list:
+        item = ET.Element("item")
+        item.attrib["n"] = f"{counter}"
+        item.text = x
+        root.append(item)
+        counter += 1
+    return root
+
+
 class ACDHTranskribusUtils:
+    def _create_session(self, pool_connections, pool_maxsize, keep_alive, gzip):
+        """creates the pooled HTTP session shared by all API calls
+        :param pool_connections: number of per-host connection pools to cache
+        :param pool_maxsize: max number of connections kept open per host
+        :param keep_alive: if False, connections are closed after each request
+        :param gzip: if True, ask the server for compressed responses
+        :return: a requests.Session
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Accept-Encoding"] = "gzip, deflate" if gzip else "identity"
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def _host_slots(self, url):
+        """returns the semaphore limiting concurrent requests to the host of url"""
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots_by_host:
+                self._host_slots_by_host[host] = threading.BoundedSemaphore(
+                    self.max_requests_per_host
+                )
+            return self._host_slots_by_host[host]
+
+    def _request(self, method, url, cached=False, **kwargs):
+        """sends a request through the shared session
+        :param method: the HTTP method, e.g. 'GET'
+        :param url: the URL to request
+        :param cached: if True and the client has a cache, GET responses are served\
+        from and stored in the cache
+        :param kwargs: kwargs will be forwarded to requests.Session.request; the login\
+        cookie is only sent to the TrpServer and the Transkribus file server
+        :return: a requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if self.login_cookie is not None and self._is_transkribus_url(url):
+            kwargs.setdefault("cookies", self.login_cookie)
+        if cached and self.cache is not None and method == "GET":
+            return self._cached_get(url, **kwargs)
+        return self._send(method, url, **kwargs)
+
+    def _is_transkribus_url(self, url):
+        """returns True if url points to the TrpServer or the Transkribus file server"""
+        return url.startswith(self.base_url) or urlsplit(url).netloc == files_host
+
+    def _send(self, method, url, **kwargs):
+        """sends a request with the retry, rate limit and circuit breaker settings
+        of self.transport
+        """
+
+        def send():
+            with self._host_slots(url):
+                return self.session.request(method, url, **kwargs)
+
+        start = time.perf_counter()
+        event = {"event": "request", "method": method, "url": url}
+        event["endpoint"] = endpoint_name(url, self.base_url)
+        try:
+            response, retries = self.transport.send(method, send)
+        except Exception as e:
+            event.update(status=None, elapsed=time.perf_counter() - start)
+            self._emit({**event, "bytes": None, "retries": getattr(e, "retries", None), "error": repr(e)})
+            raise
+        event.update(status=response.status_code, elapsed=time.perf_counter() - start)
+        event["bytes"] = response_size(response, kwargs.get("stream", False))
+        event["retries"] = retries
+        self._emit(event)
+        return response
+
+    def _emit(self, event):
+        """passes an event to the logger of this package and to the hooks of the client"""
+        emit(self.hooks, event)
+
+    @contextmanager
+    def _parse_timer(self, kind, content=None):
+        """emits a 'parse' event with the time spent in the with-block"""
+        start = time.perf_counter()
+        yield
+        self._emit(
+            {
+                "event": "parse",
+                "kind": kind,
+                "elapsed": time.perf_counter() - start,
+                "bytes": len(content) if content is not None else None,
+            }
+        )
+
+    def _cached_get(self, url, **kwargs):
+        """sends a GET request through the cache; stale entries are revalidated\
+        with a conditional GET
+        """
+        key = self.cache.key(url, kwargs.get("params"))
+        entry = self.cache.get(key)
+        event = {"event": "cache", "url": url, "endpoint": endpoint_name(url, self.base_url)}
+        if entry is not None:
+            if self.cache.is_fresh(entry, url):
+                self._emit({**event, "result": "hit"})
+                return self.cache.to_response(entry, url)
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                **self.cache.conditional_headers(entry),
+            }
+        response = self._send("GET", url, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self._emit({**event, "result": "revalidated"})
+            self.cache.revalidated(key)
+            return self.cache.to_response(entry, url)
+        self._emit({**event, "result": "miss"})
+        if response.status_code == 200:
+            self.cache.store(key, response)
+        return response
+
     def login(self, user, pw):
         """log in function
         :param user: Your TRANSKRIBUS user name, e.g. my.mail@whatever.com
@@ -23,23 +314,9 @@ class ACDHTranskribusUtils:
         :return: The Session ID in case of a successful log in attempt
         """
         request_url = f"{self.base_url}/auth/login"
-        res = requests.post(request_url, data={"user": user, "pw": pw})
-        if res.status_code == 200:
-            tree = ET.fromstring(res.content)
-            sessionid = tree.xpath("/trpUserLogin/sessionId/text()")
-            cookies = dict(JSESSIONID=sessionid[0])
-            return cookies
-        elif res.status_code == 403:
-            raise Exception(
-                f"Unable to authenticate to the Trancribus-server ({request_url}) with the provided credentials."
-                "\nCheck if you provided the correct username & password."
-                "\nPasswords/usernames containing special characters, spaces etc. may cause this behaviour. "
-                "So you might need to change your password."
-            )
-        else:
-            raise Exception(
-                f"Login at Transcribus-server ({request_url}) failed with unexspected http-status code '{res.status_code}'."  # noqa
-            )
+        res = self._request("POST", request_url, data={"user": user, "pw": pw})
+        with self._parse_timer("login", res.content):
+            return _login_cookies(res.status_code, res.content, request_url)
 
     def ft_search(self, **kwargs):
         """ Helper function to interact with TRANSKRIBUS fulltext search endpoint
@@ -53,10 +330,8 @@ class ACDHTranskribusUtils:
         else:
             return False
         querystring["type"] = "LinesLc"
-        print(querystring)
-        response = requests.request(
-            "GET", url, cookies=self.login_cookie, params=querystring
-        )
+        self._emit({"event": "ft_search", "params": querystring})
+        response = self._request("GET", url, params=querystring)
         if response.ok:
             return response.json()
         else:
@@ -67,7 +342,7 @@ class ACDHTranskribusUtils:
         :return: A dict with listing the collections
         """
         url = f"{self.base_url}/collections/list"
-        response = requests.get(url, cookies=self.login_cookie)
+        response = self._request("GET", url, cached=True)
         return response.json()
 
     def filter_collections_by_name(self, filter_string):
@@ -79,14 +354,66 @@ class ACDHTranskribusUtils:
         filtered_cols = [x for x in cols if filter_string in x["colName"]]
         return filtered_cols
 
+    def _iter_listing(self, url, page_size, sort_column, sort_direction, params):
+        """yields the items of a listing endpoint page by page, see concurrency.iter_paged"""
+        params = dict(params)
+        if sort_column is not None:
+            params["sortColumn"] = sort_column
+        if sort_direction is not None:
+            params["sortDirection"] = sort_direction
+
+        def fetch_page(index):
+            response = self._request(
+                "GET", url, cached=True, params={**params, "index": index, "nValues": page_size}
+            )
+            response.raise_for_status()
+            return response.json()
+
+        return iter_paged(fetch_page, page_size)
+
+    def iter_collections(self, page_size=100, sort_column=None, sort_direction=None, **params):
+        """Lazily lists all collections, requesting them from the server in pages of\
+        page_size; the next page is fetched while the current one is processed
+        :param page_size: Number of collections per request
+        :param sort_column: Name of the column the server sorts by, e.g. 'colName'
+        :param sort_direction: 'asc' or 'desc'
+        :param params: further query params forwarded to the endpoint
+        :return: A generator of dicts as returned by list_collections
+        """
+        url = f"{self.base_url}/collections/list"
+        return self._iter_listing(url, page_size, sort_column, sort_direction, params)
+
+    def iter_filter_collections_by_name(self, filter_string, page_size=100):
+        """lazily lists all collections which names contains 'filter_string'
+        :param filter_string: a string the collection name should contain
+        :return: A generator of the filtered collections
+        """
+        for x in self.iter_collections(page_size=page_size):
+            if filter_string in x["colName"]:
+                yield x
+
+    def iter_docs(self, col_id, page_size=100, sort_column=None, sort_direction=None, **params):
+        """Lazily lists all documents in a given collection, requesting them from the\
+        server in pages of page_size; the next page is fetched while the current one\
+        is processed
+        :param col_id: Collection ID
+        :param page_size: Number of documents per request
+        :param sort_column: Name of the column the server sorts by, e.g. 'docId' or 'title'
+        :param sort_direction: 'asc' or 'desc'
+        :param params: further query params forwarded to the endpoint
+        :return: A generator of dicts as returned by list_docs
+        """
+        url = f"{self.base_url}/collections/{col_id}/list"
+        return self._iter_listing(url, page_size, sort_column, sort_direction, params)
+
     def list_docs(self, col_id):
         """Helper function to list all documents in a given collection
         :param col_id: Collection ID
         :return: A dict with listing the collections
         """
         url = f"{self.base_url}/collections/{col_id}/list"
-        print(url)
-        response = requests.get(url, cookies=self.login_cookie)
+        self._emit({"event": "list_docs", "col_id": col_id, "url": url})
+        response = self._request("GET", url, cached=True)
         return response.json()
 
     def get_doc_md(self, doc_id, col_id):
@@ -97,7 +424,7 @@ class ACDHTranskribusUtils:
         :return: A dict with basic metadata of a transkribus Document
         """
         url = f"{self.base_url}/collections/{col_id}/{doc_id}/metadata"
-        response = requests.get(url, cookies=self.login_cookie)
+        response = self._request("GET", url, cached=True)
         return response.json()
 
     def get_doc_overview_md(self, doc_id, col_id):
@@ -107,20 +434,11 @@ class ACDHTranskribusUtils:
         :return: A dict with basic metadata of a transkribus Document
         """
         url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
-        response = requests.get(url, cookies=self.login_cookie)
+        response = self._request("GET", url, cached=True)
         if response.ok:
             result = {}
             result["trp_return"] = response.json()
-            page_list = result["trp_return"]["pageList"]["pages"]
-            result["pages"] = [
-                {
-                    "page_id": x["pageId"],
-                    "doc_id": x["docId"],
-                    "page_nr": x["pageNr"],
-                    "thumb": x["thumbUrl"],
-                }
-                for x in page_list
-            ]
+            result["pages"] = _page_summaries(result["trp_return"])
             return result
         else:
             return response.ok
@@ -133,9 +451,8 @@ class ACDHTranskribusUtils:
         :return: A dict with basic metadata of a transkribus Document
         """
         url = f"{self.base_url}/collections/{col_id}/{doc_id}/{page_id}"
-        response = requests.get(url, cookies=self.login_cookie)
+        response = self._request("GET", url, cached=True)
         if response.ok:
-            doc_xml = ET.fromstring(response.text.encode("utf8"))
             result = {
                 "doc_id": doc_id,
                 "base_url": self.base_url,
@@ -144,13 +461,8 @@ class ACDHTranskribusUtils:
                 "session_id": self.login_cookie["JSESSIONID"],
             }
             result["doc_url"] = url
-            result["doc_xml"] = doc_xml
-            result["transcript_url"] = doc_xml.xpath(
-                "//tsList/transcripts[1]/url/text()"
-            )[0]
-            result["thumb_url"] = doc_xml.xpath("./thumbUrl/text()")[0]
-            result["img_url"] = doc_xml.xpath("./url/text()")[0]
-            result["img_url"] = doc_xml.xpath("./url/text()")[0]
+            with self._parse_timer("page", response.content):
+                result.update(_page_md(response.content))
             result["extra_info"] = self.get_doc_md(
                 doc_id, col_id=col_id
             )
@@ -158,34 +470,407 @@ class ACDHTranskribusUtils:
         else:
             return response.ok
 
-    def get_transcript(self, fulldoc_md):
+    def get_transcript(self, fulldoc_md, keep_tree=True):
         """Helper function to fetch the (latest) fulltext of a TRANSKRIBUS page
         :param fulldoc_md: A dict returned by login.get_fulldoc_md
+        :param keep_tree: If set to False the PAGE XML is streamed instead of parsed\
+        into a tree; 'page_xml' is then omitted, 'transcript' holds the line level\
+        text only and 'lines' holds the dicts yielded by page.iter_text_lines
         :return: The fulldoc_md dict with additional keys 'page_xml' and 'transcript'
         """
-        nsmap = {
-            "page": "http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"
-        }
         md = fulldoc_md
         url = md["transcript_url"]
-        response = requests.get(url, cookies=self.login_cookie)
+        if not keep_tree:
+            try:
+                lines = list(self.iter_transcript_lines(url))
+            except requests.HTTPError:
+                return False
+            md["lines"] = lines
+            md["transcript"] = [x["text"] for x in lines]
+            return md
+        response = self._request("GET", url, cached=True)
         if response.ok:
-            page = ET.fromstring(response.text.encode("utf8"))
-            md["page_xml"] = page
-            md["transcript"] = page.xpath(
-                ".//page:TextLine//page:Unicode/text()", namespaces=nsmap
-            )
+            with self._parse_timer("page_xml", response.content):
+                md["page_xml"], md["transcript"] = _transcript_lines(response.content)
             return md
         else:
             return response.ok
 
+    def iter_transcript_lines(self, transcript_url):
+        """Streams the lines of a PAGE XML transcript without keeping the document in memory
+        :param transcript_url: URL of the PAGE XML, e.g. fulldoc_md['transcript_url']
+        :return: A generator of dicts with the keys 'line_id', 'region_id', 'text',\
+        'coords' and 'conf'
+        """
+        with self._request("GET", transcript_url, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            yield from iter_text_lines(response.raw)
+
+    def iter_collection_models(self, page_size=100):
+        """Lazily lists all collections as models.Collection, see iter_collections"""
+        for x in self.iter_collections(page_size=page_size):
+            yield Collection.from_trp(x)
+
+    def iter_document_models(self, col_id, page_size=100):
+        """Lazily lists all documents in a given collection as models.Document, see
+        iter_docs; the metadata payload of a document is fetched when its 'raw' is read
+        """
+        for x in self.iter_docs(col_id, page_size=page_size):
+            yield Document.from_trp(
+                x, col_id, load_raw=partial(self.get_doc_md, x["docId"], col_id)
+            )
+
+    def get_document_model(self, doc_id, col_id):
+        """Returns the metadata of a TRANSKRIBUS Document as models.Document
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        """
+        md = self.get_doc_md(doc_id, col_id)
+        return Document.from_trp(md, col_id, load_raw=partial(self.get_doc_md, doc_id, col_id))
+
+    def get_page_models(self, doc_id, col_id):
+        """Returns all pages of a TRANSKRIBUS Document as models.Page with one request\
+        to the fulldoc endpoint
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :return: A list of models.Page or False
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+        response = self._request("GET", url, cached=True)
+        if not response.ok:
+            return response.ok
+        return [Page.from_trp(x, col_id) for x in response.json()["pageList"]["pages"]]
+
+    def get_page_model(self, doc_id, col_id, page_nr=1):
+        """Returns a page of a TRANSKRIBUS Document as models.Page; a compact variant of
+        get_fulldoc_md which keeps neither the parsed response nor the document metadata
+        :param page_nr: The page number of the Document
+        :return: A models.Page or False
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/{page_nr}"
+        response = self._request("GET", url, cached=True)
+        if not response.ok:
+            return response.ok
+        with self._parse_timer("page", response.content):
+            md = _page_md(response.content)
+        return Page(
+            doc_id,
+            col_id,
+            int(page_nr),
+            img_url=md["img_url"],
+            thumb_url=md["thumb_url"],
+            ts_id=md["ts_id"],
+            transcript_url=md["transcript_url"],
+        )
+
+    def _transcript_tree(self, transcript_url):
+        """fetches and parses a PAGE XML document"""
+        response = self._request("GET", transcript_url, cached=True)
+        response.raise_for_status()
+        return ET.fromstring(response.content)
+
+    def get_transcript_model(self, page, keep_tree=False):
+        """Fetches the (latest) transcript of a page as models.Transcript; a compact
+        variant of get_transcript
+        :param page: A models.Page
+        :param keep_tree: If set to True the parsed PAGE XML is kept, otherwise it is\
+        fetched again when the 'tree' of the transcript is accessed
+        :return: A models.Transcript, None if the page has no transcript, or False
+        """
+        if page.transcript_url is None:
+            return None
+        response = self._request("GET", page.transcript_url, cached=True)
+        if not response.ok:
+            return response.ok
+        with self._parse_timer("page_xml", response.content):
+            tree, lines = _transcript_lines(response.content)
+        return Transcript(
+            page.doc_id,
+            page.col_id,
+            page.page_nr,
+            page.ts_id,
+            page.transcript_url,
+            tuple(lines),
+            partial(self._transcript_tree, page.transcript_url),
+            tree if keep_tree else None,
+        )
+
+    def iter_doc_transcripts(self, doc_id, col_id, max_workers=4):
+        """Fetches the (latest) fulltext of all pages of a TRANSKRIBUS Document with one
+        request to the fulldoc endpoint plus one request per page
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :param max_workers: Number of PAGE XML files fetched in parallel
+        :return: A generator of (page_nr, lines) tuples in order of completion; lines\
+        is an empty list for pages without transcript and None if the fetch failed
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+        response = self._request("GET", url, cached=True)
+        if not response.ok:
+            logger.warning("failed to fetch DOC-ID: %s in COLLECTION: %s", doc_id, col_id)
+            return
+
+        def fetch_lines(page):
+            page_nr, transcript_url = page
+            if transcript_url is None:
+                return []
+            res = self._request("GET", transcript_url, cached=True)
+            if not res.ok:
+                return None
+            with self._parse_timer("page_xml", res.content):
+                return _transcript_lines(res.content)[1]
+
+        pages = _latest_transcript_urls(response.json())
+        for (page_nr, _), lines, e in bounded_map(fetch_lines, pages, max_workers):
+            if e is not None:
+                logger.warning(
+                    "failed to fetch transcript of page %s of DOC-ID: %s due to ERROR: %s", page_nr, doc_id, e
+                )
+            yield page_nr, lines
+
+    def upload_transcript(
+        self, col_id, doc_id, page_nr, page_xml, parent_ts_id=None, status=None, note=None
+    ):
+        """Saves a new version of the transcript of a TRANSKRIBUS page
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :param page_nr: The page number of the Document
+        :param page_xml: The PAGE XML as bytes, string or lxml element
+        :param parent_ts_id: The ID of the transcript the new version is based on
+        :param status: The status of the new version, e.g. 'IN_PROGRESS' or 'DONE'
+        :param note: A comment stored with the new version
+        :return: The ID of the new transcript or False
+        """
+        if isinstance(page_xml, str):
+            page_xml = page_xml.encode("utf-8")
+        elif not isinstance(page_xml, bytes):
+            page_xml = ET.tostring(page_xml, encoding="utf-8")
+        params = {}
+        if parent_ts_id is not None:
+            params["parent"] = parent_ts_id
+        if status is not None:
+            params["status"] = status
+        if note is not None:
+            params["note"] = note
+        res = self._request(
+            "POST",
+            f"{self.base_url}/collections/{col_id}/{doc_id}/{page_nr}/text",
+            params=params,
+            data=page_xml,
+            headers={"Content-Type": "application/xml", "Accept": "application/json"},
+        )
+        if res.ok:
+            return res.json().get("tsId")
+        logger.warning("failed to upload transcript of page %s of DOC-ID: %s: %s", page_nr, doc_id, res.status_code)
+        return False
+
+    def iter_upload_transcripts(
+        self, pages, status=None, note=None, check_conflicts=True, max_workers=4
+    ):
+        """Saves modified transcripts of many pages concurrently and yields the outcome
+        of each upload as soon as it is done
+        :param pages: Iterable of dicts as returned by get_transcript, i.e. with the keys\
+        'col_id', 'doc_id', 'page_id' (the page number), 'ts_id' (the transcript the\
+        modification is based on) and 'page_xml'; consumed lazily
+        :param status: The status of the new versions, e.g. 'DONE'
+        :param note: A comment stored with the new versions
+        :param check_conflicts: If True, pages whose latest transcript is no longer\
+        'ts_id' are not uploaded; the latest transcript IDs are fetched once per document
+        :param max_workers: Number of uploads running in parallel
+        :return: A generator of (page, status) tuples; status is 'uploaded', 'conflict'\
+        or 'failed'; 'ts_id' of uploaded pages is set to the ID of the new version
+        """
+        latest = {}
+        latest_lock = threading.Lock()
+        doc_locks = {}
+
+        def latest_ts_ids(col_id, doc_id):
+            with latest_lock:
+                doc_lock = doc_locks.setdefault((col_id, doc_id), threading.Lock())
+            with doc_lock:
+                if (col_id, doc_id) not in latest:
+                    url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+                    response = self._request("GET", url)
+                    response.raise_for_status()
+                    latest[(col_id, doc_id)] = _latest_ts_ids(response.json())
+                return latest[(col_id, doc_id)]
+
+        def upload(page):
+            col_id, doc_id, page_nr = page["col_id"], page["doc_id"], int(page["page_id"])
+            if check_conflicts:
+                ts_ids = latest_ts_ids(col_id, doc_id)
+                if ts_ids.get(page_nr) != page.get("ts_id"):
+                    return "conflict"
+            ts_id = self.upload_transcript(
+                col_id, doc_id, page_nr, page["page_xml"], page.get("ts_id"), status, note
+            )
+            if not ts_id:
+                return "failed"
+            if check_conflicts:
+                ts_ids[page_nr] = ts_id
+            page["ts_id"] = ts_id
+            return "uploaded"
+
+        for page, result, e in bounded_map(upload, pages, max_workers):
+            if e is not None:
+                page_nr, doc_id = page.get("page_id"), page.get("doc_id")
+                logger.warning(
+                    "failed to upload transcript of page %s of DOC-ID: %s due to ERROR: %s", page_nr, doc_id, e
+                )
+                result = "failed"
+            yield page, result
+
+    def update_page_status(self, col_id, doc_id, page_nr, ts_id, status, note=None):
+        """Sets the status of a transcript, e.g. from 'IN_PROGRESS' to 'DONE'
+        :param ts_id: The ID of the transcript
+        :return: True if the status was updated
+        """
+        params = {"status": status}
+        if note is not None:
+            params["note"] = note
+        res = self._request(
+            "POST",
+            f"{self.base_url}/collections/{col_id}/{doc_id}/{page_nr}/{ts_id}",
+            params=params,
+        )
+        return res.ok
+
+    def iter_update_page_status(self, pages, status, note=None, max_workers=4):
+        """Sets the status of the transcripts of many pages concurrently
+        :param pages: Iterable of dicts with the keys 'col_id', 'doc_id', 'page_id' and\
+        'ts_id', e.g. yielded by iter_upload_transcripts
+        :param status: The new status, e.g. 'DONE'
+        :return: A generator of (page, updated) tuples
+        """
+
+        def update(page):
+            return self.update_page_status(
+                page["col_id"], page["doc_id"], page["page_id"], page["ts_id"], status, note
+            )
+
+        for page, updated, e in bounded_map(update, pages, max_workers):
+            if e is not None:
+                page_nr, doc_id = page.get("page_id"), page.get("doc_id")
+                logger.warning("failed to update status of page %s of DOC-ID: %s due to ERROR: %s", page_nr, doc_id, e)
+            yield page, bool(updated)
+
+    def iter_collection_lines(self, col_id, filter_by_doc_ids=[], max_workers=4):
+        """Streams the lines of the (latest) transcripts of all Documents from a
+        TRANSKRIBUS Collection, document by document and page by page
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param filter_by_doc_ids: Only process documents with the passed in IDs
+        :param max_workers: Number of PAGE XML files fetched in parallel
+        :return: A generator of dicts with the keys 'col_id', 'doc_id', 'page_nr',\
+        'region_id', 'line_id', 'text', 'coords' and 'conf'
+        """
+        doc_ids = [x["docId"] for x in self.list_docs(col_id)]
+        if filter_by_doc_ids:
+            filter_as_int = [int(x) for x in filter_by_doc_ids]
+            doc_ids = [x for x in doc_ids if int(x) in filter_as_int]
+
+        def fetch_lines(page):
+            page_nr, transcript_url = page
+            if transcript_url is None:
+                return []
+            return list(self.iter_transcript_lines(transcript_url))
+
+        for doc_id in doc_ids:
+            url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+            response = self._request("GET", url, cached=True)
+            if not response.ok:
+                logger.warning("failed to fetch DOC-ID: %s in COLLECTION: %s", doc_id, col_id)
+                continue
+            pages = sorted(_latest_transcript_urls(response.json()))
+            # # pages are yielded in order; bounded_map keeps the fetches ahead bounded
+            results = {}
+            next_page = 0
+            for (page_nr, _), lines, e in bounded_map(fetch_lines, pages, max_workers):
+                if e is not None:
+                    logger.warning(
+                        "failed to fetch transcript of page %s of DOC-ID: %s due to ERROR: %s", page_nr, doc_id, e
+                    )
+                    lines = []
+                results[page_nr] = lines
+                while next_page < len(pages) and pages[next_page][0] in results:
+                    current = pages[next_page][0]
+                    for line in results.pop(current):
+                        yield {"col_id": col_id, "doc_id": doc_id, "page_nr": current, **line}
+                    next_page += 1
+
+    def index_collection(
+        self, col_id, index, filter_by_doc_ids=[], max_workers=4, remove_deleted=True
+    ):
+        """Adds the (latest) transcripts of all Documents from a TRANSKRIBUS Collection
+        to a local full-text index; pages whose latest transcript is already indexed\
+        are skipped, so only new and changed pages are downloaded
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param index: a search.SearchIndex
+        :param filter_by_doc_ids: Only process documents with the passed in IDs
+        :param max_workers: Number of PAGE XML files fetched in parallel
+        :param remove_deleted: If set to True, documents no longer in the collection are\
+        removed from the index
+        :return: The number of (re)indexed pages
+        """
+        doc_ids = [x["docId"] for x in self.list_docs(col_id)]
+        if remove_deleted:
+            for doc_id in index.doc_ids(col_id) - set(doc_ids):
+                index.remove_doc(col_id, doc_id)
+        if filter_by_doc_ids:
+            filter_as_int = [int(x) for x in filter_by_doc_ids]
+            doc_ids = [x for x in doc_ids if int(x) in filter_as_int]
+
+        def fetch_lines(page):
+            return list(self.iter_transcript_lines(page[1]))
+
+        indexed = 0
+        for doc_id in doc_ids:
+            url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+            response = self._request("GET", url, cached=True)
+            if not response.ok:
+                logger.warning("failed to fetch DOC-ID: %s in COLLECTION: %s", doc_id, col_id)
+                continue
+            pages = [
+                (page_nr, transcript_url)
+                for page_nr, transcript_url in _latest_transcript_urls(response.json())
+                if transcript_url not in (None, index.page_version(col_id, doc_id, page_nr))
+            ]
+            for (page_nr, transcript_url), lines, e in bounded_map(fetch_lines, pages, max_workers):
+                if e is not None:
+                    logger.warning(
+                        "failed to fetch transcript of page %s of DOC-ID: %s due to ERROR: %s", page_nr, doc_id, e
+                    )
+                    continue
+                index.add_page(col_id, doc_id, page_nr, lines, version=transcript_url)
+                indexed += 1
+        return indexed
+
+    def collection_to_parquet(
+        self, col_id, file_name, filter_by_doc_ids=[], max_workers=4, batch_size=50000
+    ):
+        """Saves the lines of the (latest) transcripts of all Documents from a TRANSKRIBUS
+        Collection as Parquet file with one row per line; lines are streamed and written\
+        in batches of batch_size rows, so memory use does not grow with the collection.\
+        Requires pyarrow ('pip install acdh-transkribus-utils[parquet]').
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param file_name: path of the Parquet file
+        :param filter_by_doc_ids: Only process documents with the passed in IDs
+        :param max_workers: Number of PAGE XML files fetched in parallel
+        :param batch_size: Number of lines per record batch
+        :return: The number of written lines
+        """
+        lines = self.iter_collection_lines(
+            col_id, filter_by_doc_ids=filter_by_doc_ids, max_workers=max_workers
+        )
+        return write_lines_to_parquet(lines, file_name, batch_size=batch_size)
+
     def list_documents(self, col_id):
         """Helper function to interact with TRANSKRIBUS collection endpoint to list all documents
         :param col_id: The ID of a TRANSKRIBUS Collection
         :return: A dict with the default TRANSKRIBUS API return
         """
         url = f"{self.base_url}/collections/{col_id}/list"
-        response = requests.get(url, cookies=self.login_cookie)
+        response = self._request("GET", url, cached=True)
         if response.ok:
             return response.json()
         else:
@@ -198,12 +883,11 @@ class ACDHTranskribusUtils:
         :return: A dict with an lxml object of the mets file and the doc_id
         """
         url = f"{self.base_url}/collections/{col_id}/{doc_id}/mets"
-        response = requests.get(url, cookies=self.login_cookie)
+        response = self._request("GET", url, cached=True)
         if response.ok:
-            result = {
-                "doc_xml": ET.fromstring(response.text.encode("utf8")),
-                "doc_id": doc_id,
-            }
+            with self._parse_timer("mets", response.content):
+                doc_xml = ET.fromstring(response.text.encode("utf8"))
+            result = {"doc_xml": doc_xml, "doc_id": doc_id}
         else:
             result = {"doc_xml": None, "doc_id": doc_id}
         return result
@@ -216,12 +900,15 @@ class ACDHTranskribusUtils:
         """
         mets_dict = self.get_mets(doc_id, col_id)
         file_name = os.path.join(file_path, f"{mets_dict['doc_id']}_mets.xml")
+        if mets_dict["doc_xml"] is None:
+            logger.warning("failed to fetch mets for DOC-ID: %s", doc_id)
+            return None
         if os.path.isdir(file_path):
             with open(file_name, "wb") as f:
                 f.write(ET.tostring(mets_dict["doc_xml"]))
             return file_name
         else:
-            print(f"{file_path} does not exist")
+            logger.warning("%s does not exist", file_path)
             return None
 
     def get_image_names(self, doc_id, col_id):
@@ -231,7 +918,7 @@ class ACDHTranskribusUtils:
         :return: a list of images names
         """
         url = f"{self.base_url}/collections/{col_id}/{doc_id}/imageNames"
-        response = requests.get(url, cookies=self.login_cookie)
+        response = self._request("GET", url, cached=True)
         if response.ok:
             result = response.text.split("\n")
         else:
@@ -246,27 +933,119 @@ class ACDHTranskribusUtils:
         """
         file_list = self.get_image_names(doc_id, col_id)
         file_name = os.path.join(file_path, f"{doc_id}_image_name.xml")
-        root = ET.Element("list")
-        counter = 1
-        for x in file_list:
-            item = ET.Element("item")
-            item.attrib["n"] = f"{counter}"
-            item.text = x
-            root.append(item)
-            counter += 1
+        root = _image_names_to_xml(file_list)
         if os.path.isdir(file_path):
             with open(file_name, "wb") as f:
                 f.write(ET.tostring(root))
             return file_name
         else:
-            print(f"{file_path} does not exist")
+            logger.warning("%s does not exist", file_path)
             return None
 
-    def collection_to_mets(self, col_id, file_path=".", filter_by_doc_ids=[]):
+    def _download_image(self, image, file_path, chunk_size=1 << 16):
+        """streams an image to file_path unless an identical file exists there; the
+        body is written to a '.part' file in chunks which is renamed once complete and\
+        removed if the download fails
+        :param image: a dict as returned by _page_images
+        :return: 'downloaded' or 'skipped'
+        """
+        file_name = os.path.join(file_path, image["file_name"])
+        if os.path.isfile(file_name):
+            if image["md5"] is not None:
+                if _file_md5(file_name) == image["md5"]:
+                    return "skipped"
+            else:
+                head = self._request("HEAD", image["url"], allow_redirects=True)
+                size = head.headers.get("Content-Length")
+                if head.ok and size is not None and int(size) == os.path.getsize(file_name):
+                    return "skipped"
+        part_name = f"{file_name}.part"
+        md5 = hashlib.md5()
+        try:
+            with self._request("GET", image["url"], stream=True) as response:
+                response.raise_for_status()
+                with open(part_name, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        md5.update(chunk)
+                        f.write(chunk)
+            if image["md5"] is not None and md5.hexdigest() != image["md5"]:
+                raise Exception(f"checksum mismatch for {image['url']}")
+        except BaseException:
+            # # an interrupted or corrupt download leaves no '.part' file behind
+            if os.path.exists(part_name):
+                os.remove(part_name)
+            raise
+        os.replace(part_name, file_name)
+        return "downloaded"
+
+    def iter_download_doc_images(
+        self, doc_id, col_id, file_path=".", max_workers=4, iiif_size=None
+    ):
+        """Downloads the images of all pages of a TRANSKRIBUS Document into file_path;
+        the image URLs are taken from one request to the fulldoc endpoint and images\
+        already present with the same md5 hash (or size) are skipped
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param doc_id: The ID of TRANSKRIBUS Document
+        :param file_path: The directory to save the images in
+        :param max_workers: Number of images downloaded in parallel
+        :param iiif_size: If set, download scaled IIIF variants of this size, e.g. '1200,'\
+        or 'pct:50', instead of the original images
+        :return: A generator of (page_nr, file_name, status) tuples in order of completion;\
+        status is 'downloaded', 'skipped' or 'failed'
+        """
+        url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+        response = self._request("GET", url, cached=True)
+        if not response.ok:
+            logger.warning("failed to fetch DOC-ID: %s in COLLECTION: %s", doc_id, col_id)
+            return
+        os.makedirs(file_path, exist_ok=True)
+
+        def download(image):
+            return self._download_image(image, file_path)
+
+        images = _page_images(response.json(), iiif_size)
+        for image, status, e in bounded_map(download, images, max_workers):
+            if e is not None:
+                logger.warning(
+                    "failed to download image of page %s of DOC-ID: %s due to ERROR: %s", image['page_nr'], doc_id, e
+                )
+                status = "failed"
+            yield image["page_nr"], os.path.join(file_path, image["file_name"]), status
+
+    def download_collection_images(
+        self, col_id, file_path=".", filter_by_doc_ids=[], max_workers=4, iiif_size=None
+    ):
+        """Downloads the images of all Documents from a TRANSKRIBUS Collection into\
+        '<file_path>/<col_id>/<doc_id>/'; see iter_download_doc_images
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param filter_by_doc_ids: Only process documents with the passed in IDs
+        :param max_workers: Number of images downloaded in parallel
+        :param iiif_size: If set, download scaled IIIF variants of this size
+        :return: A dict mapping each doc_id to the number of failed downloads
+        """
+        doc_ids = [x["docId"] for x in self.list_docs(col_id)]
+        if filter_by_doc_ids:
+            filter_as_int = [int(x) for x in filter_by_doc_ids]
+            doc_ids = [x for x in doc_ids if int(x) in filter_as_int]
+        failed = {}
+        for doc_id in doc_ids:
+            doc_dir = os.path.join(file_path, f"{col_id}", f"{doc_id}")
+            results = self.iter_download_doc_images(
+                doc_id, col_id, doc_dir, max_workers=max_workers, iiif_size=iiif_size
+            )
+            failed[doc_id] = sum(status == "failed" for _, _, status in results)
+            logger.info("saved images of DOC-ID: %s to %s", doc_id, doc_dir)
+        return failed
+
+    def collection_to_mets(
+        self, col_id, file_path=".", filter_by_doc_ids=[], max_workers=1
+    ):
         """Saves METS files of all Documents from a TRANSKRIBUS Collection
         :param col_id: The ID of a TRANSKRIBUS Collection
         :param doc_id: The ID of TRANSKRIBUS Document
         :param filter_by_doc_ids: Only process documents with the passed in IDs
+        :param max_workers: Number of documents downloaded in parallel; the number of\
+        concurrent requests is still capped by max_requests_per_host
         :return: The full filename
         """
         mpr_docs = self.list_docs(col_id)
@@ -279,42 +1058,178 @@ class ACDHTranskribusUtils:
         if filter_by_doc_ids:
             filter_as_int = [int(x) for x in filter_by_doc_ids]
             doc_ids = [x for x in doc_ids if int(x) in filter_as_int]
-        print(f"{len(doc_ids)} to download")
+        logger.info("%s to download", len(doc_ids))
+
+        def save_doc(doc_id):
+            return self._save_doc_files(doc_id, col_id, col_dir)
+
         counter = 1
-        for doc_id in doc_ids:
-            try:
-                save_mets = self.save_mets_to_file(doc_id, col_id, file_path=col_dir)
-            except Exception as e:
-                print(f"failed to save mets for DOC-ID: {doc_id} in COLLECTION: {col_id} due to ERROR: {e}")
-                counter += 1
-                continue
-            file_list = self.save_image_names_to_file(doc_id, col_id, file_path=col_dir)
-            print(f"saving: {save_mets}")
-            print(f"saving: {file_list}")
-            print(f"{counter}/{len(doc_ids)}")
+        for doc_id, saved, e in bounded_map(save_doc, doc_ids, max_workers):
+            if e is None and saved[0] is None:
+                e = "no METS file returned"
+            if e is not None:
+                logger.warning(
+                    "failed to save mets for DOC-ID: %s in COLLECTION: %s due to ERROR: %s", doc_id, col_id, e
+                )
+            else:
+                save_mets, file_list = saved
+                logger.info("saving: %s", save_mets)
+                logger.info("saving: %s", file_list)
+                logger.info("%s/%s", counter, len(doc_ids))
             counter += 1
 
         return doc_ids
 
+    def _save_doc_files(self, doc_id, col_id, col_dir):
+        """saves the METS file and the image names of a Document into col_dir"""
+        save_mets = self.save_mets_to_file(doc_id, col_id, file_path=col_dir)
+        if save_mets is None:
+            return None, None
+        file_list = self.save_image_names_to_file(doc_id, col_id, file_path=col_dir)
+        return save_mets, file_list
+
+    def sync_collection_to_mets(
+        self,
+        col_id,
+        file_path=".",
+        max_workers=1,
+        remove_deleted=True,
+        manifest_name="sync_manifest.json",
+    ):
+        """Incrementally syncs the METS files and image names of all Documents from a
+        TRANSKRIBUS Collection into `{file_path}/{col_id}`; only documents whose
+        transcripts changed since the last sync are downloaded again. The state of the
+        last sync is kept in a manifest file in the collection folder.
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param file_path: folder to save the collection folder into
+        :param max_workers: Number of documents processed in parallel
+        :param remove_deleted: If set to True, files of documents no longer in the\
+        collection are removed
+        :param manifest_name: file name of the manifest
+        :return: A dict listing the doc_ids which were 'added', 'changed',\
+        'unchanged', 'deleted' and 'failed'
+        """
+        col_dir = os.path.join(file_path, f"{col_id}")
+        os.makedirs(col_dir, exist_ok=True)
+        manifest_file = os.path.join(col_dir, manifest_name)
+        try:
+            with open(manifest_file, "r") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        doc_ids = [x["docId"] for x in self.list_docs(col_id)]
+        report = {"added": [], "changed": [], "unchanged": [], "deleted": [], "failed": []}
+
+        def sync_doc(doc_id):
+            url = f"{self.base_url}/collections/{col_id}/{doc_id}/fulldoc"
+            response = self._request("GET", url, cached=True)
+            response.raise_for_status()
+            fingerprint = _doc_fingerprint(response.json())
+            files_exist = all(
+                os.path.isfile(os.path.join(col_dir, x))
+                for x in [f"{doc_id}_mets.xml", f"{doc_id}_image_name.xml"]
+            )
+            if manifest.get(f"{doc_id}") == fingerprint and files_exist:
+                return "unchanged", fingerprint
+            save_mets, _ = self._save_doc_files(doc_id, col_id, col_dir)
+            if save_mets is None:
+                raise Exception(f"could not save {doc_id}_mets.xml")
+            return ("changed" if f"{doc_id}" in manifest else "added"), fingerprint
+
+        for doc_id, synced, e in bounded_map(sync_doc, doc_ids, max_workers):
+            if e is not None:
+                logger.warning("failed to sync DOC-ID: %s in COLLECTION: %s due to ERROR: %s", doc_id, col_id, e)
+                report["failed"].append(doc_id)
+                continue
+            status, fingerprint = synced
+            report[status].append(doc_id)
+            manifest[f"{doc_id}"] = fingerprint
+        for doc_id in set(manifest) - {f"{x}" for x in doc_ids}:
+            report["deleted"].append(int(doc_id))
+            del manifest[doc_id]
+            if remove_deleted:
+                for x in [f"{doc_id}_mets.xml", f"{doc_id}_image_name.xml"]:
+                    try:
+                        os.remove(os.path.join(col_dir, x))
+                    except FileNotFoundError:
+                        pass
+        with open(f"{manifest_file}.tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{manifest_file}.tmp", manifest_file)
+        logger.info(
+            "%s", ", ".join(f"{len(value)} {key}" for key, value in report.items())
+        )
+        return report
+
     def search_for_document(self, title, col_id):
         """Searches for a document with given title in a collection
         :param col_id: The ID of a TRANSKRIBUS Collection
         :param title: Title of the document
         """
-        res = requests.get(
+        res = self._request(
+            "GET",
             f"{self.base_url}/collections/findDocuments",
-            cookies=self.login_cookie,
             params={"collId": col_id, "title": title},
         )
         return res.json()
 
+    def _title_index(self, col_id):
+        """returns the set of normalized titles of all documents in a collection,
+        built once from list_docs
+        """
+        col_id = f"{col_id}"
+        with self._title_index_lock:
+            if col_id not in self._title_indexes:
+                self._title_indexes[col_id] = {
+                    _normalize_title(x["title"]) for x in self.list_docs(col_id)
+                }
+            return self._title_indexes[col_id]
+
+    def document_exists(self, title, col_id):
+        """Checks if a document with given title exists in a collection by looking it up
+        in a local index of the collection's titles instead of searching the server
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param title: Title of the document
+        :return: True if a document with that (whitespace and case normalized) title exists
+        """
+        return _normalize_title(title) in self._title_index(col_id)
+
+    def refresh_title_index(self, col_id=None):
+        """Drops the local title index of a collection (or of all collections if col_id is
+        None), e.g. after documents were added or deleted by someone else
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        """
+        with self._title_index_lock:
+            if col_id is None:
+                self._title_indexes.clear()
+            else:
+                self._title_indexes.pop(f"{col_id}", None)
+
+    def _reserve_title(self, title, col_id):
+        """adds a title to the title index of a collection before its document is
+        uploaded, so concurrent uploads of the same title are not both sent
+        :return: False if the title is already in the index
+        """
+        index = self._title_index(col_id)
+        title = _normalize_title(title)
+        with self._title_index_lock:
+            if title in index:
+                return False
+            index.add(title)
+            return True
+
+    def _release_title(self, title, col_id):
+        """removes a title reserved by _reserve_title after its upload failed"""
+        with self._title_index_lock:
+            self._title_indexes.get(f"{col_id}", set()).discard(_normalize_title(title))
+
     def search_for_collection(self, title):
         """Searches for a collection by title
         :param title: Title of the TRANSKRIBUS Collection
         """
-        res = requests.get(
+        res = self._request(
+            "GET",
             f"{self.base_url}/collections/listByName",
-            cookies=self.login_cookie,
             params={"name": title},
             headers={"Accept": "application/json"},
         )
@@ -324,113 +1239,169 @@ class ACDHTranskribusUtils:
         """Creates a new collection and returns the collectionId
         :param title: Title of the TRANSKRIBUS Collection
         """
-        res = requests.post(
+        res = self._request(
+            "POST",
             f"{self.base_url}/collections/createCollection",
-            cookies=self.login_cookie,
             params={"collName": title},
         )
         if res.status_code == 200:
             return res.content.decode("utf8")
         else:
-            print("error: ", res.status_code, res.content)
+            logger.warning("error: %s %s", res.status_code, res.content)
             return False
 
     def get_or_create_collection(self, title):
-        """Get or create TRANSKRIBUS collection ID
+        """Get or create TRANSKRIBUS collection ID; resolved IDs are memoized, the memo is
+        prewarmed once from list_collections and concurrent calls for the same title
+        never create the collection twice
         :param title: Title of the TRANSKRIBUS Collection
         """
-        col = self.search_for_collection(title=title)
-        if len(col) == 0:
-            col = self.create_collection(title=title)
-            return col
-        else:
-            print(col)
-            return col[0]["colId"]
+        with self._collection_ids_lock:
+            if self._collection_ids is None:
+                self._collection_ids = {
+                    x["colName"]: x["colId"] for x in self.list_collections()
+                }
+            if title in self._collection_ids:
+                return self._collection_ids[title]
+            title_lock = self._collection_title_locks.setdefault(title, threading.Lock())
+        with title_lock:
+            if title in self._collection_ids:
+                return self._collection_ids[title]
+            col = self.search_for_collection(title=title)
+            if len(col) == 0:
+                col_id = self.create_collection(title=title)
+            else:
+                logger.debug("found collection %s", col)
+                col_id = col[0]["colId"]
+            if col_id:
+                self._collection_ids[title] = col_id
+            return col_id
 
     def upload_mets_file_from_url(self, mets_url, col_id, better_images=False):
         """Takes an URL to a METS file and posts that URL to Transkribus
         :param mets_url: URL of the METS file
         :param col_id: Transkribus CollectionID
+        :return: True if the document was created, False if it failed or already exists
         """
-        doc_title = get_title_from_mets(mets_url)
-        doc_exists = self.search_for_document(title=doc_title, col_id=col_id)
-        if len(doc_exists) == 0:
+        return self._upload_mets_file(mets_url, col_id, better_images) == "uploaded"
+
+    def _upload_mets_file(self, mets_url, col_id, better_images=False):
+        """uploads a METS file like upload_mets_file_from_url
+        :return: 'uploaded', 'exists' or 'failed'
+        """
+        response = self._request("GET", mets_url)
+        if not response.ok:
+            logger.warning("failed to fetch METS file %s: %s", mets_url, response.status_code)
+            return "failed"
+        with self._parse_timer("goobi_mets", response.content):
+            mets = MetsDocument(response.content)
+        doc_title = mets.get_title()
+        if not self._reserve_title(doc_title, col_id):
+            logger.info(
+                "a document with title: %s already exists in collection %s", doc_title, col_id
+            )
+            return "exists"
+        try:
             if better_images:
-                new_mets_str = replace_img_urls_in_mets(mets_url)
-                new_mets_file = io.BytesIO(new_mets_str.encode("utf-8"))
-                files = [("mets", ("mets.xml", new_mets_file, "text/xml"))]
+                mets.replace_img_urls()
+                mets.remove_unresolved_fptrs()
+                files = [("mets", ("mets.xml", mets.to_bytes(), "text/xml"))]
                 url = f"{self.base_url}/collections/{col_id}/createDocFromMets?colId={col_id}"
-                res = requests.post(url, cookies=self.login_cookie, files=files)
-                if res.status_code == 200:
-                    return True
-                else:
-                    print("Error: ", res.status_code, res.content)
-                    return False
+                res = self._request("POST", url, files=files)
             else:
-                res = requests.post(
+                res = self._request(
+                    "POST",
                     f"{self.base_url}/collections/{col_id}/createDocFromMetsUrl",
-                    cookies=self.login_cookie,
                     params={"fileName": mets_url},
                 )
-                if res.status_code == 200:
-                    return True
-                else:
-                    print("Error: ", res.status_code, res.content)
-                    return False
+        except BaseException:
+            self._release_title(doc_title, col_id)
+            raise
+        if res.status_code == 200:
+            return "uploaded"
         else:
-            print(
-                f"a document with title: {doc_title} already exists in collection {col_id}"
-            )
-            return False
+            self._release_title(doc_title, col_id)
+            logger.warning("Error: %s %s", res.status_code, res.content)
+            return "failed"
 
-    def upload_mets_files_from_goobi(
-        self, file_titles, check_name=True, col_regex=None, col_id=None
+    def iter_upload_mets_files_from_goobi(
+        self, file_titles, check_name=True, col_regex=None, col_id=None, max_workers=1
     ):
-        """Uploads all file_ids from Goobi via METS in Transkribus
-        :param file_titles: Array with file titles to upload
+        """Uploads all file_ids from Goobi via METS in Transkribus and yields the outcome
+        of each upload as soon as it is done
+        :param file_titles: Iterable with file titles to upload, consumed lazily
         :param col_id: The ID of a TRANSKRIBUS Collection
         :param check_name (boolean): If set to True checks first if file exist and omits upload if file already exists
         :param col_regex: regex to be used to create collection from file name
+        :param max_workers: Number of uploads running in parallel
+        :return: A generator of (file_title, status) tuples; status is 'uploaded',\
+        'exists' or 'failed'
         """
         if col_regex is None and col_id is None:
             raise AttributeError("You need to specify either col_regex or col_id")
         pattern = False
         if col_id is None:
             pattern = re.compile(col_regex)
-        for f in file_titles:
+
+        def upload(f):
+            f_col_id = col_id
             if pattern:
                 col_name = pattern.match(f)
-                col_id = self.get_or_create_collection(col_name.group())
-            if check_name:
-                s1 = self.search_for_document(f, col_id)
-                if len(s1) == 0:
-                    self.upload_mets_file_from_url(
-                        self.goobi_base_url.format(f), col_id=col_id
-                    )
+                f_col_id = self.get_or_create_collection(col_name.group())
+            if check_name and self.document_exists(f, f_col_id):
+                return "exists"
+            return self._upload_mets_file(self.goobi_base_url.format(f), col_id=f_col_id)
+
+        for f, status, e in bounded_map(upload, file_titles, max_workers):
+            if e is not None:
+                logger.warning("failed to upload %s due to ERROR: %s", f, e)
+                status = "failed"
+            yield f, status
+
+    def upload_mets_files_from_goobi(
+        self, file_titles, check_name=True, col_regex=None, col_id=None, max_workers=1
+    ):
+        """Uploads all file_ids from Goobi via METS in Transkribus
+        :param file_titles: Array with file titles to upload
+        :param col_id: The ID of a TRANSKRIBUS Collection
+        :param check_name (boolean): If set to True checks first if file exist and omits upload if file already exists
+        :param col_regex: regex to be used to create collection from file name
+        :param max_workers: Number of uploads running in parallel
+        """
+        for _ in self.iter_upload_mets_files_from_goobi(
+            file_titles,
+            check_name=check_name,
+            col_regex=col_regex,
+            col_id=col_id,
+            max_workers=max_workers,
+        ):
+            pass
 
     def upload_iiif_from_url(self, iiif_url, col_id):
         """Takes an URL to a IIIF Manifest and posts that URL to Transkribus
         :param iiif_url: URL of the IIIF Manifest
         :param col_id: Transkribus CollectionID
         """
-        # ToDo: check if document with same title already exists
         doc_title = get_title_from_iiif(iiif_url)
-        doc_exists = self.search_for_document(title=doc_title, col_id=col_id)
-        if len(doc_exists) == 0:
-            res = requests.post(
+        if not self._reserve_title(doc_title, col_id):
+            logger.info(
+                "a document with title: %s already exists in collection %s", doc_title, col_id
+            )
+            return False
+        try:
+            res = self._request(
+                "POST",
                 f"{self.base_url}/collections/{col_id}/createDocFromIiifUrl",
-                cookies=self.login_cookie,
                 params={"fileName": iiif_url},
             )
-            if res.status_code == 200:
-                return True
-            else:
-                print("Error: ", res.status_code, res.content)
-                return False
+        except BaseException:
+            self._release_title(doc_title, col_id)
+            raise
+        if res.status_code == 200:
+            return True
         else:
-            print(
-                f"a document with title: {doc_title} already exists in collection {col_id}"
-            )
+            self._release_title(doc_title, col_id)
+            logger.warning("Error: %s %s", res.status_code, res.content)
             return False
 
     def get_user_id(self, user_name: str) -> int:
@@ -439,9 +1410,9 @@ class ACDHTranskribusUtils:
 
         :return: the user's ID
         """
-        r = requests.get(
+        r = self._request(
+            "GET",
             f"{self.base_url}/user/list",
-            cookies=self.login_cookie,
             params={"user": user_name},
         )
         response = r.json()
@@ -459,51 +1430,105 @@ class ACDHTranskribusUtils:
         params = {"userid": user_id, "role": role}
         if not send_mail:
             params = {"userid": user_id, "role": role, "sendMail": False}
-        res = requests.post(
+        res = self._request(
+            "POST",
             f"{self.base_url}/collections/{col_id}/addOrModifyUserInCollection",
-            cookies=self.login_cookie,
             params=params,
         )
         if res.status_code == 200:
             result_msg = f"added user {user_name} to collection {col_id}"
         return result_msg
 
+    def iter_status_report(
+        self, filter_string: str, transcription_threshold: int = 10, max_workers: int = 1
+    ):
+        """yields a report about each document in the filterd collections as soon as it
+        is fetched; collections and documents are processed concurrently
+        :param filter_string: a string the collection name should contain
+        :param transcription_threshold: minimum number of transcribed lines
+        to qualify a document as transcribed
+        :param max_workers: number of collections and documents processed in parallel
+
+        :return: a generator of dicts
+        """
+        cols = self.filter_collections_by_name(filter_string)
+        logger.info("found %s matching %s", len(cols), filter_string)
+
+        def list_col_docs(col):
+            return self.list_docs(col["colId"])
+
+        def docs_to_process():
+            for col, doc_list, e in bounded_map(list_col_docs, cols, max_workers):
+                col_id = col["colId"]
+                if e is not None:
+                    logger.warning("failed to list documents of COLLECTION: %s due to ERROR: %s", col_id, e)
+                    continue
+                logger.info("processing %s documents from collection %s", len(doc_list), col_id)
+                for y in doc_list:
+                    yield col_id, y["docId"]
+
+        def doc_stats(doc):
+            col_id, doc_id = doc
+            doc_md = self.get_doc_md(doc_id, col_id)
+            transcribed_lines = doc_md["nrOfTranscribedLines"]
+            return {
+                "doc_id": doc_id,
+                "col_id": col_id,
+                "doc_title": doc_md["title"],
+                "doc_transcribed": transcribed_lines > transcription_threshold,
+                "pages": doc_md["nrOfPages"],
+                "doc_thumb": doc_md["thumbUrl"],
+                "doc_md": doc_md,
+            }
+
+        for (col_id, doc_id), stats, e in bounded_map(
+            doc_stats, docs_to_process(), max_workers
+        ):
+            if e is not None:
+                logger.warning("failed to fetch DOC-ID: %s in COLLECTION: %s due to ERROR: %s", doc_id, col_id, e)
+                continue
+            yield stats
+
     def create_status_report(
-        self, filter_string: str, transcription_threshold: int = 10
+        self, filter_string: str, transcription_threshold: int = 10, max_workers: int = 1
     ) -> list:
         """generates a report about the documents in the filterd collections
         :param filter_string: a string the collection name should contain
         :param transcription_threshold: minimum number of transcribed lines
         to qualify a document as transcribed
+        :param max_workers: number of collections and documents processed in parallel
 
         :return: a list dicts
         """
-        cols = self.filter_collections_by_name(filter_string)
-        print(f"found {len(cols)} matching {filter_string}")
-        docs = []
-        for x in cols:
-            col_id = x["colId"]
-            doc_list = self.list_docs(col_id)
-            print(f"processing {len(doc_list)} documents from collection {col_id}")
-            for y in doc_list:
-                transcribed = False
-                doc_id = y["docId"]
-                doc_overview = self.get_doc_overview_md(doc_id, col_id)
-                doc_md = doc_overview["trp_return"]["md"]
-                transcribed_lines = doc_md["nrOfTranscribedLines"]
-                if transcribed_lines > transcription_threshold:
-                    transcribed = True
-                doc_stats = {
-                    "doc_id": doc_id,
-                    "col_id": col_id,
-                    "doc_title": doc_md["title"],
-                    "doc_transcribed": transcribed,
-                    "pages": doc_md["nrOfPages"],
-                    "doc_thumb": doc_md["thumbUrl"],
-                    "doc_md": doc_md,
-                }
-                docs.append(doc_stats)
-        return docs
+        return list(
+            self.iter_status_report(filter_string, transcription_threshold, max_workers)
+        )
+
+    def status_report_to_jsonl(
+        self,
+        file_name: str,
+        filter_string: str,
+        transcription_threshold: int = 10,
+        max_workers: int = 1,
+    ) -> int:
+        """writes a report about the documents in the filterd collections to a JSON Lines
+        file, one document per line, without keeping the report in memory
+        :param file_name: the path of the JSONL file
+        :param filter_string: a string the collection name should contain
+        :param transcription_threshold: minimum number of transcribed lines
+        to qualify a document as transcribed
+        :param max_workers: number of collections and documents processed in parallel
+
+        :return: the number of written documents
+        """
+        counter = 0
+        with open(file_name, "w", encoding="utf-8") as f:
+            for doc_stats in self.iter_status_report(
+                filter_string, transcription_threshold, max_workers
+            ):
+                f.write(json.dumps(doc_stats, ensure_ascii=False) + "\n")
+                counter += 1
+        return counter
 
     def run_htr(
         self,
@@ -521,17 +1546,111 @@ class ACDHTranskribusUtils:
         else:
             pages = f"{start_page}"
         params = {"id": doc_id, "pages": pages}
-        res = requests.post(
+        res = self._request(
+            "POST",
             f"{self.base_url}/recognition/{col_id}/{model_id}/trhtr",
-            cookies=self.login_cookie,
             params=params,
         )
         if res.status_code == 200:
             job_id = res.text
-            print(f"started HTR for DOC-ID: {doc_id} with JOB-ID {job_id}")
+            logger.info("started HTR for DOC-ID: %s with JOB-ID %s", doc_id, job_id)
             return job_id
         else:
-            print("something went wrong")
+            logger.warning("failed to start HTR for DOC-ID: %s: %s", doc_id, res.status_code)
+
+    def get_job_status(self, job_id):
+        """Helper function to interact with TRANSKRIBUS jobs endpoint
+        :param job_id: The ID of a job, e.g. returned by run_htr
+        :return: A dict with the status of the job, its 'state' is one of 'CREATED',\
+        'WAITING', 'RUNNING', 'FINISHED', 'FAILED' or 'CANCELED'
+        """
+        response = self._request("GET", f"{self.base_url}/jobs/{job_id}")
+        if response.ok:
+            return response.json()
+        else:
+            return response.ok
+
+    def iter_run_htr(
+        self,
+        docs,
+        model_id=51170,
+        max_in_flight=4,
+        min_interval=2,
+        max_interval=60,
+        fetch_transcripts=False,
+        max_workers=4,
+        max_failed_polls=10,
+    ):
+        """Runs HTR for many documents keeping at most max_in_flight jobs running and
+        yields each job as soon as it is done; the status of a job is polled with an\
+        interval growing from min_interval to max_interval while it does not change
+        :param docs: Iterable of (col_id, doc_id) or (col_id, doc_id, start_page, end_page)\
+        tuples, consumed lazily
+        :param model_id: The ID of the HTR model
+        :param max_in_flight: Max number of jobs started but not yet done
+        :param min_interval: Seconds between the first status polls of a job
+        :param max_interval: Max seconds between two status polls of a job
+        :param fetch_transcripts: If True, the (latest) fulltext of all pages of each\
+        successfully processed document is fetched, see iter_doc_transcripts
+        :param max_workers: Number of PAGE XML files fetched in parallel
+        :param max_failed_polls: Consecutive failed status polls after which a job is\
+        reported as 'FAILED'
+        :return: A generator of dicts with the keys 'col_id', 'doc_id', 'job_id', 'state'\
+        and 'status' ('transcripts' mapping page_nr to lines with fetch_transcripts);\
+        'state' is 'FAILED' and 'job_id' None if the job could not be started
+        """
+        docs = iter(docs)
+        poller = JobPoller(min_interval, max_interval, max_failed_polls=max_failed_polls)
+        exhausted = False
+        while True:
+            while not exhausted and len(poller) < max_in_flight:
+                doc = next(docs, None)
+                if doc is None:
+                    exhausted = True
+                    break
+                job = {"col_id": doc[0], "doc_id": doc[1]}
+                try:
+                    job_id = self.run_htr(*doc, model_id=model_id)
+                except requests.RequestException as e:
+                    logger.warning("failed to start HTR for DOC-ID: %s due to ERROR: %s", doc[1], e)
+                    job_id = None
+                if job_id is None:
+                    yield {**job, "job_id": None, "state": "FAILED", "status": None}
+                    continue
+                poller.add(job_id, {**job, "job_id": job_id})
+            if not len(poller):
+                return
+            job_id, wait = poller.next_due()
+            time.sleep(wait)
+            try:
+                status = self.get_job_status(job_id)
+            except requests.RequestException as e:
+                logger.warning("failed to fetch the status of JOB-ID %s due to ERROR: %s", job_id, e)
+                status = False
+            job = poller.update(job_id, job_state(status))
+            if job is None:
+                continue
+            # # a job without state was given up after max_failed_polls failed polls
+            job["state"], job["status"] = job_state(status) or "FAILED", status or None
+            if fetch_transcripts and job["state"] == "FINISHED":
+                job["transcripts"] = dict(
+                    self.iter_doc_transcripts(job["doc_id"], job["col_id"], max_workers)
+                )
+            yield job
+
+    def close(self):
+        """writes the buffered state of the cache, closes its database connection and
+        the connection pool of the session
+        """
+        if self.cache is not None:
+            self.cache.close()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def __init__(
         self,
@@ -539,7 +1658,38 @@ class ACDHTranskribusUtils:
         password=None,
         transkribus_base_url=base_url,
         goobi_base_url=None,
+        pool_connections=10,
+        pool_maxsize=10,
+        keep_alive=True,
+        gzip=True,
+        timeout=(10, 120),
+        max_requests_per_host=None,
+        cache_path=None,
+        cache_max_size=512 * 1024 * 1024,
+        cache_ttls=None,
+        transport=None,
+        hooks=None,
     ) -> None:
+        """
+        :param pool_connections: number of per-host connection pools to cache
+        :param pool_maxsize: max number of connections kept open per host
+        :param keep_alive: reuse connections between requests
+        :param gzip: ask the server for compressed responses
+        :param timeout: (connect, read) timeout in seconds used for all requests
+        :param max_requests_per_host: max number of concurrent requests sent to\
+        one host, defaults to pool_maxsize
+        :param cache_path: path of a SQLite file; if set, responses of the read\
+        endpoints are cached there and revalidated with conditional GETs
+        :param cache_max_size: max size of the cache in bytes
+        :param cache_ttls: dict mapping a URL regex to the seconds a cached response\
+        is used without revalidation, see cache.DEFAULT_TTLS
+        :param transport: a transport.TransportPolicy with the retry, rate limit and\
+        circuit breaker settings used for all requests
+        :param hooks: callables receiving an event dict for each request ('request'\
+        with endpoint, status, elapsed seconds, bytes and retries), cache lookup ('cache')\
+        and parsed XML response ('parse'), see metrics.MetricsCollector; events are also\
+        logged at DEBUG level by the 'transkribus_utils' logger
+        """
         if user is None:
             user = os.environ.get("TRANSKRIBUS_USER", None)
             self.user = user
@@ -564,8 +1714,26 @@ class ACDHTranskribusUtils:
         if goobi_base_url is None:
             goobi_base_url = os.environ.get("GOOBI_BASE_URL", None)
             if goobi_base_url is None:
-                print("WARNING: Goobi url not set")
+                logger.warning("Goobi url not set")
         self.base_url = transkribus_base_url
+        self.timeout = timeout
+        self.max_requests_per_host = max_requests_per_host or pool_maxsize
+        self._host_slots_by_host = {}
+        self._host_slots_lock = threading.Lock()
+        self.transport = transport if transport is not None else TransportPolicy()
+        self.hooks = list(hooks) if hooks is not None else []
+        self._collection_ids = None
+        self._collection_ids_lock = threading.Lock()
+        self._collection_title_locks = {}
+        self._title_indexes = {}
+        self._title_index_lock = threading.Lock()
+        self.cache = None
+        if cache_path is not None:
+            self.cache = HTTPCache(cache_path, max_size=cache_max_size, ttls=cache_ttls)
+        self.session = self._create_session(
+            pool_connections, pool_maxsize, keep_alive, gzip
+        )
+        self.login_cookie = None
         self.login_cookie = self.login(user, password)
         if goobi_base_url is not None:
             self.goobi_base_url = goobi_base_url + "?id={}"
@@ -0,0 +1,226 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# statuses meaning the server did not process the request, so any method may be retried
+RETRY_ANY_METHOD_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class RateLimiter:
+    """client-side token bucket allowing `rate` requests per second with bursts of
+    up to `burst` requests
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """takes a token and returns the seconds to wait before it may be used"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """holds back requests for `reset_timeout` seconds after `failure_threshold`
+    consecutive failures; afterwards a single probe request is let through while the
+    others keep waiting, its success closes the circuit, its failure opens it again
+    """
+
+    def __init__(self, failure_threshold=10, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """returns the seconds to wait before a request may be sent; 0 lets the request
+        through, claiming the probe if the circuit is half-open
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            now = time.monotonic()
+            remaining = self._opened_at + self.reset_timeout - now
+            if remaining > 0:
+                return remaining
+            # # a probe which never reported back (e.g. it raised) is replaced after reset_timeout
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return min(1, self.reset_timeout)
+            self._probe_started = now
+            return 0
+
+    def before_request(self):
+        """blocks while the circuit is open"""
+        delay = self.reserve()
+        while delay:
+            time.sleep(delay)
+            delay = self.reserve()
+
+    async def before_request_async(self):
+        """waits while the circuit is open, see before_request"""
+        delay = self.reserve()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self.reserve()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_started is not None or (
+                self._opened_at is None and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+
+class TransportPolicy:
+    """retry, rate limit and circuit breaker settings shared by all requests of a client
+
+    :param max_retries: max number of retries of a failed request
+    :param backoff_factor: the n-th retry waits a random time up to\
+    backoff_factor * 2 ** n seconds (exponential backoff with full jitter)
+    :param max_backoff: upper limit of the wait time between retries in seconds
+    :param rate_limit: max number of requests per second, None for no limit
+    :param burst: number of requests which may exceed the rate limit at once
+    :param failure_threshold: consecutive failures which open the circuit breaker
+    :param reset_timeout: seconds the circuit breaker holds back requests before\
+    probing the server again
+    """
+
+    def __init__(
+        self,
+        max_retries=5,
+        backoff_factor=0.5,
+        max_backoff=60,
+        rate_limit=None,
+        burst=None,
+        failure_threshold=10,
+        reset_timeout=60,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.rate_limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def should_retry(self, method, attempt, status_code=None):
+        """checks if a request which failed with status_code (None for connection
+        errors) may be sent again
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status_code is None:
+            return method in IDEMPOTENT_METHODS
+        if status_code in RETRY_ANY_METHOD_STATUSES:
+            return True
+        return status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+
+    def delay(self, attempt, retry_after=None):
+        """returns the seconds to wait before the next attempt, honoring Retry-After"""
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                try:
+                    seconds = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    seconds = None
+            if seconds is not None:
+                return min(max(seconds, 0), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2**attempt))
+
+    def _rate_limit_delay(self):
+        if self.rate_limiter is not None:
+            return self.rate_limiter.reserve()
+        return 0
+
+    def _record(self, status_code=None):
+        if status_code is None or status_code in RETRY_STATUSES:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+
+    def send(
+        self,
+        method,
+        send,
+        transient_errors=(requests.ConnectionError, requests.Timeout),
+    ):
+        """sends a request with retries
+        :param method: the HTTP method, e.g. 'GET'
+        :param send: a callable sending the request and returning the response
+        :param transient_errors: exceptions which count as a failed attempt; the one\
+        raised after the last attempt carries the number of retries as `retries`
+        :return: the last response and the number of retries
+        """
+        attempt = 0
+        while True:
+            self.circuit_breaker.before_request()
+            time.sleep(self._rate_limit_delay())
+            try:
+                response = send()
+            except transient_errors as e:
+                self._record()
+                if not self.should_retry(method, attempt):
+                    e.retries = attempt
+                    raise
+                time.sleep(self.delay(attempt))
+                attempt += 1
+                continue
+            self._record(response.status_code)
+            if not self.should_retry(method, attempt, response.status_code):
+                return response, attempt
+            time.sleep(self.delay(attempt, response.headers.get("Retry-After")))
+            response.close()
+            attempt += 1
+
+    async def send_async(self, method, send, transient_errors):
+        """sends a request with retries, see send
+        :param send: a callable returning an awaitable of the response
+        """
+        attempt = 0
+        while True:
+            await self.circuit_breaker.before_request_async()
+            await asyncio.sleep(self._rate_limit_delay())
+            try:
+                response = await send()
+            except transient_errors as e:
+                self._record()
+                if not self.should_retry(method, attempt):
+                    e.retries = attempt
+                    raise
+                await asyncio.sleep(self.delay(attempt))
+                attempt += 1
+                continue
+            self._record(response.status_code)
+            if not self.should_retry(method, attempt, response.status_code):
+                return response, attempt
+            await asyncio.sleep(self.delay(attempt, response.headers.get("Retry-After")))
+            await response.aclose()
+            attempt += 1
@@ -0,0 +1,40 @@
+"""namespaces and precompiled XPath expressions shared by all parsers; compiling them
+once at import saves parsing the expression on every call. Text results are plain
+strings (smart_strings=False), so they do not keep the parsed tree alive.
+"""
+import lxml.etree as ET
+
+PAGE_2013_NS = "http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"
+PAGE_2019_NS = "http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15"
+METS_NS = "http://www.loc.gov/METS/"
+MODS_NS = "http://www.loc.gov/mods/v3"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+
+PAGE_NSMAP = {"page": PAGE_2013_NS}
+PAGE_2019_NSMAP = {"page": PAGE_2019_NS}
+METS_NSMAP = {"mets": METS_NS, "mods": MODS_NS, "xlink": XLINK_NS}
+
+# TrpServer responses
+TRP_SESSION_ID = ET.XPath("/trpUserLogin/sessionId/text()", smart_strings=False)
+TRP_TRANSCRIPT_URL = ET.XPath("//tsList/transcripts[1]/url/text()", smart_strings=False)
+TRP_TS_ID = ET.XPath("//tsList/transcripts[1]/tsId/text()", smart_strings=False)
+TRP_THUMB_URL = ET.XPath("./thumbUrl/text()", smart_strings=False)
+TRP_IMG_URL = ET.XPath("./url/text()", smart_strings=False)
+
+# PAGE XML
+_LINE_TEXT = ".//page:TextLine//page:Unicode/text()"
+PAGE_LINE_TEXT = {
+    PAGE_2013_NS: ET.XPath(_LINE_TEXT, namespaces=PAGE_NSMAP, smart_strings=False),
+    PAGE_2019_NS: ET.XPath(_LINE_TEXT, namespaces=PAGE_2019_NSMAP, smart_strings=False),
+}
+
+# METS/MODS
+MODS_TITLE = ET.XPath(".//mods:title/text()", namespaces=METS_NSMAP, smart_strings=False)
+
+
+def page_line_text(page):
+    """returns the text of all Unicode elements within the TextLines of a parsed PAGE
+    XML document, using the XPath matching its schema version
+    """
+    xpath = PAGE_LINE_TEXT.get(ET.QName(page).namespace, PAGE_LINE_TEXT[PAGE_2013_NS])
+    return xpath(page)